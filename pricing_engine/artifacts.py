@@ -0,0 +1,151 @@
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import platform
+import shutil
+import tempfile
+
+import numpy as np
+
+# versioned bundles of fitted pricing models, so a book can be scored
+# without retraining (see score.py). A bundle is a folder
+#   manifest.json   format version, bundle id, creation time, library
+#                   versions, model backend, feature columns, strategy
+#                   config, price grid and the checksum of models.pkl
+#   models.pkl      freq_model, sev_model, demand_model, burn_cost_glm
+#                   (GLM coefficients only)
+# bundles are written to a temporary folder and renamed into place, named
+# bundle-<UTC time>-<id>, so a parent folder keeps every version and
+# load_bundle() on it picks the newest.
+#
+# models.pkl is a pickle: only load bundles you produced yourself.
+
+BUNDLE_FORMAT = 1
+MANIFEST = "manifest.json"
+MODELS_FILE = "models.pkl"
+
+MODEL_KEYS = ["freq_model", "sev_model", "demand_model", "burn_cost_glm"]
+DEFAULT_BUNDLE_DIR = "artifacts"
+
+
+def _library_versions():
+    import pandas
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _scoring_model(model):
+    # statsmodels results hold the training frame and need statsmodels to
+    # unpickle; scoring the GLM only needs its coefficients
+    if hasattr(model, "remove_data"):
+        return model.params
+    return model
+
+
+def save_bundle(models, config, folder=DEFAULT_BUNDLE_DIR, price_grid=None, backend="gbm", metadata=None):
+    # models: {freq_model, sev_model, demand_model, burn_cost_glm (optional),
+    # feature_cols, demand_cols}; returns the bundle path
+    os.makedirs(folder, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=folder, prefix=".bundle-")
+    os.chmod(tmp, 0o755)
+
+    models_path = os.path.join(tmp, MODELS_FILE)
+    with open(models_path, "wb") as f:
+        pickle.dump({k: _scoring_model(models.get(k)) for k in MODEL_KEYS}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    checksum = _sha256(models_path)
+
+    created = datetime.datetime.now(datetime.timezone.utc)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "bundle_id": checksum[:12],
+        "created": created.isoformat(timespec="seconds"),
+        "versions": _library_versions(),
+        "backend": backend,
+        "feature_cols": list(models["feature_cols"]),
+        "demand_cols": list(models["demand_cols"]),
+        "config": dict(config),
+        "price_grid": None if price_grid is None else [float(p) for p in price_grid],
+        "models_sha256": checksum,
+        "metadata": metadata or {},
+    }
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    path = os.path.join(folder, f"bundle-{created:%Y%m%dT%H%M%SZ}-{manifest['bundle_id']}")
+    if os.path.exists(path):
+        # same models saved twice within a second
+        shutil.rmtree(tmp)
+    else:
+        os.replace(tmp, path)
+    return path
+
+
+def list_bundles(folder=DEFAULT_BUNDLE_DIR):
+    # bundle paths in the folder, oldest first
+    if not os.path.isdir(folder):
+        return []
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.startswith("bundle-") and os.path.isfile(os.path.join(folder, name, MANIFEST))
+    )
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def resolve_bundle(path=DEFAULT_BUNDLE_DIR):
+    # a bundle folder, or a parent folder of bundles (newest wins)
+    if os.path.isfile(os.path.join(path, MANIFEST)):
+        return path
+    bundles = list_bundles(path)
+    if not bundles:
+        raise FileNotFoundError(f"No model bundle in {path}")
+    return bundles[-1]
+
+
+def load_bundle(path=DEFAULT_BUNDLE_DIR):
+    # returns (models, manifest); models is ready for pricing/quote.price_quotes
+    path = resolve_bundle(path)
+    manifest = read_manifest(path)
+
+    if manifest["format"] != BUNDLE_FORMAT:
+        raise ValueError(f"Bundle format {manifest['format']} is not supported (expected {BUNDLE_FORMAT})")
+
+    models_path = os.path.join(path, MODELS_FILE)
+    if _sha256(models_path) != manifest["models_sha256"]:
+        raise ValueError(f"{models_path} does not match its manifest checksum")
+
+    versions = _library_versions()
+    if manifest["versions"]["sklearn"] != versions["sklearn"]:
+        print(
+            f"Warning: bundle {manifest['bundle_id']} was fitted with scikit-learn "
+            f"{manifest['versions']['sklearn']}, running {versions['sklearn']}"
+        )
+
+    with open(models_path, "rb") as f:
+        models = pickle.load(f)
+
+    models.update(
+        feature_cols=manifest["feature_cols"],
+        demand_cols=manifest["demand_cols"],
+        backend=manifest["backend"],
+    )
+    return models, manifest
@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.risk.true_risk import true_risk_score
+from pricing_engine.risk.simulate_claims import draw_claims
+
+# benchmark for the batched claims engine vs the old per-policy loop
+# python -m pricing_engine.benchmarks.claims --sizes 100000 1000000 10000000
+#
+# the loop takes minutes at 10M rows, so above --loop-limit it runs on the
+# first loop_limit policies only and its time is scaled up linearly (marked ~)
+
+LOOP_LIMIT = 100_000
+
+
+def draw_claims_loop(risk, rng, base_severity=600):
+    # reference: the original per-policy implementation
+    risk = np.asarray(risk, dtype=np.float64)
+    n_claims = rng.poisson(lam=np.exp(-3.5 + 0.4 * risk))
+    severity_mean = base_severity * risk
+
+    incurred = []
+    for n, mean_sev in zip(n_claims, severity_mean):
+        if n == 0:
+            incurred.append(0.0)
+        else:
+            claims = rng.gamma(shape=2.0, scale=mean_sev / 2.0, size=n)
+            incurred.append(claims.sum())
+
+    return n_claims, np.array(incurred)
+
+
+def sample_risk(n, seed=0, sample_size=100_000):
+    # resample a realistic risk profile rather than generating n policies
+    risk = np.asarray(true_risk_score(generate_policy_data(n=sample_size)))
+    return np.random.default_rng(seed).choice(risk, size=n)
+
+
+def time_call(func, *args, repeats=1):
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes, seed=2, loop_limit=LOOP_LIMIT, repeats=3):
+    rows = []
+    for n in sizes:
+        risk = sample_risk(n)
+
+        batched_time, (n_claims, incurred) = time_call(
+            lambda: draw_claims(risk, np.random.default_rng(seed)),
+            repeats=repeats
+        )
+
+        loop_risk = risk[:loop_limit]
+        if len(loop_risk) < n:
+            # compare on the prefix the loop runs on
+            n_claims, incurred = draw_claims(loop_risk, np.random.default_rng(seed))
+
+        loop_time, (loop_n, loop_incurred) = time_call(
+            lambda: draw_claims_loop(loop_risk, np.random.default_rng(seed))
+        )
+        assert np.array_equal(n_claims, loop_n)
+        assert np.allclose(incurred, loop_incurred, rtol=1e-12, atol=0)
+
+        estimated = len(loop_risk) < n
+        loop_time *= n / len(loop_risk)
+
+        rows.append({
+            "n_policies": n,
+            "loop_s": loop_time,
+            "loop_estimated": estimated,
+            "batched_s": batched_time,
+            "speedup": loop_time / batched_time,
+        })
+        mark = "~" if estimated else " "
+        print(
+            f"n={n:>11,} | loop {mark}{loop_time:8.3f}s | batched {batched_time:8.3f}s"
+            f" | speedup {mark}{loop_time / batched_time:6.1f}x"
+        )
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="simulate_claims benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--seed", type=int, default=2)
+    parser.add_argument("--loop-limit", type=int, default=LOOP_LIMIT,
+                        help="run the per-policy loop on at most this many rows and scale its time up")
+    args = parser.parse_args()
+
+    run(args.sizes, seed=args.seed, loop_limit=args.loop_limit)
+
+
+if __name__ == "__main__":
+    main()
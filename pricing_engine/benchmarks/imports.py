@@ -0,0 +1,78 @@
+import argparse
+import subprocess
+import sys
+
+# import-time budget check for the entry points. Each module is imported
+# in a fresh interpreter under `python -X importtime` and fails the check
+# (exit code 1) when its cumulative import time is over budget or it loads
+# one of the heavy stacks that are only imported where they are used:
+# sklearn on the first fit or model load, scipy.stats for drift p-values
+# and replication intervals, statsmodels for the GLM fit, matplotlib /
+# seaborn when plots are rendered.
+# python -m pricing_engine.benchmarks.imports
+# python -m pricing_engine.benchmarks.imports --budget-scale 2   (slow machine)
+
+HEAVY_MODULES = ["sklearn", "scipy.stats", "statsmodels", "matplotlib", "seaborn"]
+
+# module -> cumulative import seconds
+IMPORT_BUDGETS = {
+    "pricing_engine.main": 1.5,
+    "pricing_engine.experiments.runner": 1.5,
+    "pricing_engine.experiments.grid": 1.0,
+    "pricing_engine.streaming": 1.5,
+    "pricing_engine.score": 1.5,
+    "pricing_engine.quote_service": 1.5,
+}
+
+
+def import_profile(module):
+    # {imported module: cumulative seconds} for one cold import
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # the last entry is the outermost import of that name
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def check_module(module, budget, repeats=3):
+    # best of repeats, so a cold disk cache does not count against the budget
+    profiles = [import_profile(module) for _ in range(repeats)]
+    seconds = min(p[module] for p in profiles)
+    heavy = [m for m in HEAVY_MODULES if m in profiles[0]]
+    return {"module": module, "seconds": seconds, "budget": budget, "heavy": heavy,
+            "ok": seconds <= budget and not heavy}
+
+
+def run(budgets=IMPORT_BUDGETS, budget_scale=1.0, repeats=3):
+    rows = []
+    for module, budget in budgets.items():
+        row = check_module(module, budget * budget_scale, repeats)
+        rows.append(row)
+        status = "ok" if row["ok"] else "FAIL"
+        heavy = f" | loads {', '.join(row['heavy'])}" if row["heavy"] else ""
+        print(f"{module:<36} {row['seconds'] * 1e3:8.0f}ms / {row['budget'] * 1e3:6.0f}ms  {status}{heavy}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budgets for the entry points")
+    parser.add_argument("--modules", nargs="+", choices=list(IMPORT_BUDGETS), default=list(IMPORT_BUDGETS))
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="multiply every budget, e.g. on a slow CI machine")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = run({m: IMPORT_BUDGETS[m] for m in args.modules}, args.budget_scale, args.repeats)
+    if not all(row["ok"] for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
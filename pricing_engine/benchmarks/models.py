@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.risk.true_risk import true_risk_score
+from pricing_engine.risk.simulate_claims import simulate_claims
+from pricing_engine.risk.frequency import prepare_features, fit_frequency_model
+from pricing_engine.risk.severity import fit_severity_model
+from pricing_engine.risk.burn_cost import calculate_burn_cost
+from pricing_engine.model_cache import configure
+
+# fit time and burn-cost accuracy of the frequency / severity backends
+# python -m pricing_engine.benchmarks.models --sizes 100000 1000000 5000000
+#
+# accuracy is measured on a separate holdout book against the true expected
+# cost from the claims simulator, E[n_claims] * E[severity]
+
+
+def true_burn_cost(df, base_severity=600):
+    # same parameters as risk/simulate_claims.draw_claims
+    risk = np.asarray(true_risk_score(df), dtype=np.float64)
+    return np.exp(-3.5 + 0.4 * risk) * base_severity * risk
+
+
+def fit_backend(df, backend):
+    start = time.perf_counter()
+    X = prepare_features(df, backend)
+    freq_model, _ = fit_frequency_model(df, backend)
+    sev_model = fit_severity_model(df, X, backend)
+    return time.perf_counter() - start, freq_model, sev_model
+
+
+def score(freq_model, sev_model, holdout, expected, backend):
+    X = prepare_features(holdout, backend)
+    pred = calculate_burn_cost(freq_model, sev_model, X)
+    return {
+        "rmse": float(np.sqrt(np.mean((pred - expected) ** 2))),
+        "mae": float(np.mean(np.abs(pred - expected))),
+        # total predicted / total expected cost
+        "bias": float(pred.sum() / expected.sum()),
+    }
+
+
+def n_trees(model):
+    return getattr(model, "n_iter_", getattr(model, "n_estimators_", np.nan))
+
+
+def run(sizes, backends=("gbm", "hist"), seed=0, holdout_size=200_000, gbm_limit=None):
+    # fitted models are never read from / written to the on-disk cache here
+    configure(enabled=False)
+
+    holdout = simulate_claims(generate_policy_data(n=holdout_size, seed=seed + 1), seed=seed + 1)
+    expected = true_burn_cost(holdout)
+
+    rows = []
+    for n in sizes:
+        df = simulate_claims(generate_policy_data(n=n, seed=seed), seed=seed)
+
+        for backend in backends:
+            if backend == "gbm" and gbm_limit is not None and n > gbm_limit:
+                continue
+
+            fit_s, freq_model, sev_model = fit_backend(df, backend)
+            row = {
+                "n_policies": n,
+                "backend": backend,
+                "fit_s": fit_s,
+                "freq_trees": n_trees(freq_model),
+                "sev_trees": n_trees(sev_model),
+                **score(freq_model, sev_model, holdout, expected, backend),
+            }
+            rows.append(row)
+            print(
+                f"n={n:>11,} | {backend:<4} | fit {fit_s:8.2f}s"
+                f" | trees {row['freq_trees']:>4}/{row['sev_trees']:<4}"
+                f" | rmse {row['rmse']:8.3f} | mae {row['mae']:8.3f} | bias {row['bias']:6.3f}"
+            )
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="frequency / severity backend benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--backends", nargs="+", default=["gbm", "hist"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--holdout-size", type=int, default=200_000)
+    parser.add_argument("--gbm-limit", type=int, default=None,
+                        help="skip the exact-split backend above this many rows")
+    args = parser.parse_args()
+
+    run(
+        args.sizes,
+        backends=args.backends,
+        seed=args.seed,
+        holdout_size=args.holdout_size,
+        gbm_limit=args.gbm_limit
+    )
+
+
+if __name__ == "__main__":
+    main()
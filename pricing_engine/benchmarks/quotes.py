@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.quote_service import (
+    QUOTE_FIELDS, add_service_arguments, service_from_args, start_server
+)
+from pricing_engine.streaming_stats import QuantileSketch
+
+# load generator for the quote service: `concurrency` keep-alive clients each
+# send single-policy quotes back to back and time every round trip.
+# Without --url a service is started in-process on a free port.
+# python -m pricing_engine.benchmarks.quotes --requests 20000 --concurrency 64
+# python -m pricing_engine.benchmarks.quotes --url 127.0.0.1:8080
+
+
+def sample_quotes(n, seed=1):
+    df = generate_policy_data(n=n, seed=seed)[QUOTE_FIELDS]
+    records = df.astype({c: str for c in ["smoker", "bmi", "plan"]}).to_dict("records")
+    # plain Python scalars for json
+    return [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in r.items()} for r in records]
+
+
+def _request(method, path, host, payload=None):
+    body = b"" if payload is None else json.dumps(payload).encode()
+    head = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"\r\n"
+    )
+    return head.encode() + body
+
+
+async def _read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, quotes, latency, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    for policy in quotes:
+        start = time.perf_counter()
+        writer.write(_request("POST", "/quote", host, policy))
+        await writer.drain()
+        status, _ = await _read_response(reader)
+        latency.append((time.perf_counter() - start) * 1000)
+        if status != 200:
+            errors.append(status)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def server_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(_request("GET", "/stats", host))
+    await writer.drain()
+    _, stats = await _read_response(reader)
+    writer.close()
+    await writer.wait_closed()
+    return stats
+
+
+async def run(host, port, n_requests, concurrency, warmup=500):
+    quotes = sample_quotes(n_requests + warmup)
+
+    # warm-up: kernels compiled, connections and caches hot
+    await client(host, port, quotes[:warmup], [], [])
+    quotes = quotes[warmup:]
+
+    latency = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, quotes[i::concurrency], latency, errors)
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    sketch = QuantileSketch()
+    sketch.update(latency)
+    p50, p99 = sketch.quantile([0.5, 0.99])
+    print(
+        f"{len(latency):,} quotes from {concurrency} clients in {elapsed:.2f}s"
+        f" | {len(latency) / elapsed:,.0f} quotes/s"
+        f" | round trip p50 {p50:.1f}ms p99 {p99:.1f}ms | errors {len(errors)}"
+    )
+
+    stats = await server_stats(host, port)
+    print(
+        f"server: {stats['quotes']:,} quotes in {stats['batches']:,} batches"
+        f" (mean {stats['mean_batch_size']:.1f})"
+        f" | queue + pricing p50 {stats['latency_p50_ms']:.1f}ms p99 {stats['latency_p99_ms']:.1f}ms"
+    )
+    return {"quotes_per_s": len(latency) / elapsed, "p50_ms": p50, "p99_ms": p99, "errors": len(errors), **stats}
+
+
+async def run_in_process(args):
+    service = service_from_args(args)
+    server = await start_server(service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        result = await run("127.0.0.1", port, args.requests, args.concurrency)
+    await service.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quote service load generator")
+    parser.add_argument("--url", default=None,
+                        help="host:port of a running service (default: start one in-process)")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    add_service_arguments(parser)
+    args = parser.parse_args()
+
+    if args.url:
+        host, port = args.url.rsplit(":", 1)
+        asyncio.run(run(host, int(port), args.requests, args.concurrency))
+    else:
+        asyncio.run(run_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
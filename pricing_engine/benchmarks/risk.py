@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.data.schema import category_codes, is_level
+from pricing_engine.risk.true_risk import true_risk_score, HAS_NUMBA
+
+# micro-benchmark for the true_risk_score kernel vs the previous
+# array-at-a-time version, reusing one output buffer across repeats
+# python -m pricing_engine.benchmarks.risk --sizes 100000 1000000 10000000
+
+
+def true_risk_score_arrays(df):
+    # reference: the previous implementation, one temporary per factor
+    age_factor = 0.015 * df["age"].to_numpy()
+    smoker_factor = np.where(is_level(df["smoker"], "smoker", "Y"), 0.6, 0.0)
+    bmi_factor = np.array([0.1, 0.0, 0.3, 0.7])[category_codes(df["bmi"], "bmi")]
+    plan_factor = np.array([0.8, 1.0, 1.3])[category_codes(df["plan"], "plan")]
+    excess_factor = -0.0002 * df["excess"].to_numpy()
+
+    risk_score = (0.8 + age_factor + smoker_factor + bmi_factor + excess_factor) * plan_factor
+    return np.clip(risk_score, 0.3, 5.0)
+
+
+def time_call(func, repeats):
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes, backends, repeats=5, seed=100):
+    rows = []
+    for n in sizes:
+        df = generate_policy_data(n=n, seed=seed)
+        out = np.empty(n)
+
+        ref_time, expected = time_call(lambda: true_risk_score_arrays(df), repeats)
+        line = f"n={n:>11,} | arrays {ref_time * 1e3:8.1f}ms"
+        row = {"n_policies": n, "arrays_ms": ref_time * 1e3}
+
+        for backend in backends:
+            # warm-up call compiles / loads the numba kernel
+            true_risk_score(df.iloc[:10], backend=backend)
+            t, result = time_call(lambda: true_risk_score(df, out=out, backend=backend), repeats)
+            assert np.array_equal(result, expected), backend
+            row[f"{backend}_ms"] = t * 1e3
+            line += f" | {backend} {t * 1e3:8.1f}ms ({ref_time / t:4.1f}x)"
+
+        rows.append(row)
+        print(line)
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="true_risk_score micro-benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--backends", nargs="+", choices=["numpy", "numba"],
+                        default=["numpy", "numba"] if HAS_NUMBA else ["numpy"])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.sizes, args.backends, repeats=args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from functools import cached_property, partial
+
+import numpy as np
+import pandas as pd
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.risk.true_risk import true_risk_score
+from pricing_engine.risk.simulate_claims import simulate_claims
+from pricing_engine.risk.frequency import prepare_features, fit_frequency_model
+from pricing_engine.risk.severity import fit_severity_model
+from pricing_engine.risk.burn_cost import calculate_burn_cost
+from pricing_engine.risk.backends import add_backend_argument, configure_backend, model_backend
+from pricing_engine.pricing.simulate_demand import simulate_demand
+from pricing_engine.pricing.demand import demand_feature_matrix
+from pricing_engine.pricing.optimisation import optimise_price
+from pricing_engine.pricing.quote import DEFAULT_PRICE_GRID
+from pricing_engine.constraints.rules import compile_rules
+from pricing_engine.monitoring.ave import calculate_ave, EXPERIMENT_AVE_COLUMNS
+from pricing_engine.evaluation.experiment_reporting import summarize_experiments
+from pricing_engine.experiments import runner
+from pricing_engine.streaming import fit_models
+from pricing_engine.model_cache import configure
+from pricing_engine.stage_graph import StageCache
+
+from pricing_engine.config.base import CONFIG
+
+# benchmark suite over the pipeline's hot functions with scale sweeps and
+# regression tracking. Every case runs at each size in --sizes up to its
+# max_n (see CASES) and records the best-of-repeats wall time and, in a
+# separate run, the tracemalloc peak above the allocation at entry.
+# Results go to a JSON file; with --baseline they are compared case by
+# case and the run fails (exit code 1) when a case is slower or uses more
+# memory than the thresholds allow.
+#
+# python -m pricing_engine.benchmarks.suite --sizes 10000 100000 1000000 10000000
+# python -m pricing_engine.benchmarks.suite --baseline benchmark_results/baseline.json --update-baseline
+# python -m pricing_engine.benchmarks.suite --baseline benchmark_results/baseline.json --cases optimise_price constraints
+#
+# model and stage caches are off throughout, so every call does the work.
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+TRAIN_SIZE = 50_000
+WARMUP_SIZE = 1_000
+# largest book the model-fit cases run on, by backend
+FIT_LIMITS = {"gbm": 100_000, "hist": 10_000_000}
+
+TIME_THRESHOLD = 0.25
+MEMORY_THRESHOLD = 0.25
+# differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.01
+MIN_MB = 1.0
+
+
+class Fixtures:
+    # inputs for the cases at one size, built on first use; the models are
+    # fitted once on a TRAIN_SIZE book so prediction cases only vary in n
+
+    def __init__(self, n, models, seed=0):
+        self.n = n
+        self.models = models
+        self.seed = seed
+
+    @cached_property
+    def book(self):
+        return generate_policy_data(n=self.n, seed=self.seed)
+
+    @cached_property
+    def claims(self):
+        return simulate_claims(self.book, seed=self.seed)
+
+    @cached_property
+    def X(self):
+        return prepare_features(self.claims)
+
+    @cached_property
+    def model_X(self):
+        return self.X.reindex(columns=self.models["feature_cols"], fill_value=0)
+
+    @cached_property
+    def burn_cost(self):
+        return calculate_burn_cost(self.models["freq_model"], self.models["sev_model"], self.model_X)
+
+    @cached_property
+    def base_price(self):
+        return self.burn_cost * (1 + CONFIG["profit_margin"])
+
+    @cached_property
+    def market_price(self):
+        return self.base_price * 1.2 * np.random.default_rng(self.seed).normal(1.0, 0.05, size=self.n)
+
+    @cached_property
+    def demand_features(self):
+        return demand_feature_matrix(self.book.assign(rel_price=1.0), self.models["demand_cols"])
+
+    @cached_property
+    def optimise_inputs(self):
+        return dict(
+            base_price=self.base_price,
+            price_grid=DEFAULT_PRICE_GRID,
+            demand_model=self.models["demand_model"],
+            demand_features=self.demand_features,
+            burn_cost=self.burn_cost,
+            expenses=25 * CONFIG["expense_multiplier"]
+        )
+
+    @cached_property
+    def optimised_price(self):
+        return optimise_price(**self.optimise_inputs)[0]
+
+    @cached_property
+    def constraint_inputs(self):
+        return dict(
+            price=self.optimised_price,
+            previous_price=self.base_price * 0.95,
+            declined_price=np.nan
+        )
+
+    @cached_property
+    def results(self):
+        # one experiment summary row per grid cell, from this book's prices
+        rng = np.random.default_rng(self.seed)
+        rows = []
+        for name, _, strategy_name, _ in runner.build_grid():
+            renewal = rng.uniform(0.3, 0.9, size=self.n)
+            columns = {
+                "renewal_likelihood": renewal,
+                "actual_renewal": rng.binomial(1, renewal).astype(np.int8),
+                "optimised_loading": self.optimised_price / self.base_price - 1,
+                "final_price": self.optimised_price,
+                "incurred": self.claims["incurred"].to_numpy(),
+            }
+            rows.append({"scenario": name, "strategy_name": strategy_name, **calculate_ave(columns, columns=EXPERIMENT_AVE_COLUMNS)})
+        return pd.DataFrame(rows)
+
+
+def _summarize(results):
+    # a fresh folder per call, so the plot cache never skips the work
+    with tempfile.TemporaryDirectory(prefix="bench_summary_") as folder:
+        summarize_experiments(results, output_folder=folder, workers=1)
+
+
+def _runner_main(fx, workers=1):
+    with tempfile.TemporaryDirectory(prefix="bench_runner_") as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        try:
+            runner.main(workers=workers, plots=False)
+        finally:
+            os.chdir(cwd)
+
+
+# name -> (fixtures -> zero-argument call, max_n); the case runs at every
+# size up to max_n (None: all sizes, "fit": FIT_LIMITS), "fixed" cases do
+# not scale with n and run once, on the smallest book. make resolves every
+# fixture the call needs, so nothing is built lazily inside the timed region
+# and a case times the same whichever cases ran before it
+CASES = {
+    "generate_policy_data": (lambda fx: partial(generate_policy_data, n=fx.n, seed=fx.seed), None),
+    "simulate_claims": (lambda fx: partial(simulate_claims, fx.book, seed=fx.seed), None),
+    "true_risk_score": (lambda fx: partial(true_risk_score, fx.book), None),
+    "prepare_features": (lambda fx: partial(prepare_features, fx.claims), None),
+    "fit_frequency_model": (lambda fx: partial(fit_frequency_model, fx.claims), "fit"),
+    "fit_severity_model": (lambda fx: partial(fit_severity_model, fx.claims, fx.X), "fit"),
+    "calculate_burn_cost": (
+        lambda fx: partial(calculate_burn_cost, fx.models["freq_model"], fx.models["sev_model"], fx.model_X),
+        None
+    ),
+    "simulate_demand": (
+        lambda fx: partial(simulate_demand, fx.book, premium=fx.base_price, market_price=fx.market_price, seed=fx.seed),
+        None
+    ),
+    "optimise_price": (lambda fx: partial(optimise_price, **fx.optimise_inputs), None),
+    "constraints": (
+        lambda fx: partial(compile_rules(CONFIG).apply, fx.book, **fx.constraint_inputs),
+        None
+    ),
+    # 12 grid cells of results, pivots and heatmaps
+    "summarize_experiments": (lambda fx: partial(_summarize, fx.results), "fixed"),
+    # the experiment grid end to end, on its own 50k policy records
+    "runner_main": (lambda fx: partial(_runner_main, fx), "fixed"),
+}
+
+# too slow to warm up or repeat; timed from a single call
+SINGLE_SHOT = {"runner_main"}
+
+
+def time_call(func, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func):
+    # MB above what was allocated at entry; numpy and pandas buffers are traced
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - start) / 1024 ** 2
+
+
+def environment():
+    import sklearn
+
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "model_backend": model_backend(),
+    }
+
+
+def run(cases, sizes, repeats=3, memory=True, seed=0):
+    configure(enabled=False)
+    os.environ[StageCache.enabled_env] = "0"
+
+    print(f"Fitting models on {TRAIN_SIZE:,} policies...")
+    models = fit_models(simulate_claims(generate_policy_data(n=TRAIN_SIZE, seed=seed + 1), seed=seed + 1), seed=seed)
+
+    # warm-up: numba kernels compiled / loaded, lazy imports done
+    warm = Fixtures(WARMUP_SIZE, models, seed)
+    for name in cases:
+        make, _ = CASES[name]
+        if name not in SINGLE_SHOT:
+            make(warm)()
+
+    sizes = sorted(sizes)
+    rows = []
+    for n in sizes:
+        fx = Fixtures(n, models, seed)
+        for name in cases:
+            make, max_n = CASES[name]
+            if max_n == "fit":
+                max_n = FIT_LIMITS[model_backend()]
+            if max_n == "fixed" and n != sizes[0]:
+                continue
+            if max_n not in (None, "fixed") and n > max_n:
+                continue
+
+            func = make(fx)
+            # one call at the largest sizes is enough and keeps a sweep bounded
+            n_repeats = 1 if (n >= 1_000_000 or name in SINGLE_SHOT) else repeats
+            seconds = time_call(func, n_repeats)
+            fixed = max_n == "fixed"
+            row = {
+                "case": name,
+                "n": None if fixed else n,
+                "time_s": seconds,
+                "peak_mb": peak_memory(func) if memory else None,
+                "rows_per_s": None if fixed else n / seconds,
+            }
+            rows.append(row)
+
+            line = f"{name:<22} n={'fixed' if fixed else f'{n:,}':>11} | {seconds * 1e3:10.1f}ms"
+            if not fixed:
+                line += f" | {row['rows_per_s']:>14,.0f} rows/s"
+            if memory:
+                line += f" | peak {row['peak_mb']:9.1f}MB"
+            print(line)
+
+    return rows
+
+
+def save_results(rows, filename):
+    folder = os.path.dirname(filename)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(filename, "w") as f:
+        json.dump({"environment": environment(), "results": rows}, f, indent=2)
+    print(f"Benchmark results saved to {filename}")
+
+
+def load_results(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(rows, baseline, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    # returns the comparison table and the regressed (case, n, reason) list
+    base = {(r["case"], r["n"]): r for r in baseline["results"]}
+    table = []
+    regressions = []
+    for row in rows:
+        old = base.get((row["case"], row["n"]))
+        if old is None:
+            continue
+        time_ratio = row["time_s"] / old["time_s"] if old["time_s"] else np.nan
+        entry = {"case": row["case"], "n": row["n"], "time_ratio": time_ratio, "memory_ratio": np.nan}
+        if row["time_s"] - old["time_s"] > MIN_SECONDS and time_ratio > 1 + time_threshold:
+            regressions.append((row["case"], row["n"], f"time {time_ratio:.2f}x"))
+
+        if row.get("peak_mb") is not None and old.get("peak_mb"):
+            memory_ratio = row["peak_mb"] / old["peak_mb"]
+            entry["memory_ratio"] = memory_ratio
+            if row["peak_mb"] - old["peak_mb"] > MIN_MB and memory_ratio > 1 + memory_threshold:
+                regressions.append((row["case"], row["n"], f"peak memory {memory_ratio:.2f}x"))
+        table.append(entry)
+
+    return pd.DataFrame(table), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline benchmark suite with baseline comparison")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeats", type=int, default=3, help="best of, below 1M rows")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory runs")
+    parser.add_argument("--output", default=os.path.join("benchmark_results", "latest.json"))
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write these results to --baseline instead of comparing")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD,
+                        help="allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD,
+                        help="allowed peak-memory growth before failing")
+    parser.add_argument("--seed", type=int, default=0)
+    add_backend_argument(parser)
+    args = parser.parse_args()
+
+    configure_backend(args.model_backend)
+    rows = run(args.cases, args.sizes, repeats=args.repeats, memory=not args.no_memory, seed=args.seed)
+    save_results(rows, args.output)
+
+    if args.baseline is None:
+        return
+    if args.update_baseline or not os.path.exists(args.baseline):
+        save_results(rows, args.baseline)
+        return
+
+    baseline = load_results(args.baseline)
+    env, base_env = environment(), baseline["environment"]
+    changed = [k for k in ["machine", "cpu_count", "python", "numpy", "pandas", "sklearn", "model_backend"] if env[k] != base_env.get(k)]
+    if changed:
+        print(f"Note: baseline was recorded with different {', '.join(changed)}")
+
+    table, regressions = compare(rows, baseline, args.time_threshold, args.memory_threshold)
+    print("\n--- vs baseline (ratio > 1 is slower / bigger) ---")
+    print(table.round(2).to_string(index=False))
+
+    if regressions:
+        print("\nRegressions:")
+        for case, n, reason in regressions:
+            print(f"  {case} n={n}: {reason}")
+        raise SystemExit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
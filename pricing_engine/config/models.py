@@ -0,0 +1,49 @@
+# training backends for the frequency / severity models
+#   "gbm"  - exact-split GradientBoostingRegressor on one-hot features
+#   "hist" - HistGradientBoostingRegressor: native categoricals, Poisson /
+#            gamma losses, multi-threaded, early stopping on a validation split
+MODEL_CONFIG = {
+    "backend": "gbm",
+
+    "gbm": {
+        "frequency": {
+            "loss": "squared_error",
+            "max_depth": 3,
+            "n_estimators": 150,
+            "learning_rate": 0.05,
+            "random_state": 42
+        },
+        "severity": {
+            "loss": "squared_error",
+            "max_depth": 3,
+            "n_estimators": 200,
+            "learning_rate": 0.05,
+            "random_state": 42
+        },
+    },
+
+    "hist": {
+        "frequency": {
+            "loss": "poisson",            # claim counts
+            "max_iter": 500,
+            "learning_rate": 0.1,
+            "max_leaf_nodes": 15,
+            "min_samples_leaf": 200,
+            "early_stopping": True,       # stops on validation_fraction of the rows
+            "validation_fraction": 0.1,
+            "n_iter_no_change": 20,
+            "random_state": 42
+        },
+        "severity": {
+            "loss": "gamma",              # positive, right-skewed claim sizes
+            "max_iter": 500,
+            "learning_rate": 0.1,
+            "max_leaf_nodes": 15,
+            "min_samples_leaf": 100,
+            "early_stopping": True,
+            "validation_fraction": 0.1,
+            "n_iter_no_change": 20,
+            "random_state": 42
+        },
+    },
+}
@@ -0,0 +1,15 @@
+# true risk of the simulated book (what claims are drawn from):
+#   clip((base + age * age_slope + smoker + bmi + excess * excess_slope) * plan, *clip)
+# factors are keyed by level (see data/schema.py); the kernel turns them
+# into lookup tables indexed by category code
+TRUE_RISK_CONFIG = {
+    "base": 0.8,
+    "age_slope": 0.015,
+    "excess_slope": -0.0002,      # higher excess -> lower utilisation
+
+    "smoker": {"Y": 0.6, "N": 0.0},
+    "bmi": {"Underweight": 0.1, "Normal": 0.0, "Overweight": 0.3, "Obese": 0.7},
+    "plan": {"Budget": 0.8, "Standard": 1.0, "Premium": 1.3},
+
+    "clip": (0.3, 5.0),
+}
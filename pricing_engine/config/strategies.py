@@ -0,0 +1,11 @@
+from pricing_engine.config.base import CONFIG as BASE_CONFIG
+from pricing_engine.config.aggressive import CONFIG as AGGRESSIVE_CONFIG
+from pricing_engine.config.conservative import CONFIG as CONSERVATIVE_CONFIG
+
+# pricing strategies by name, as used by the experiments, the quote service
+# and the scoring CLI
+STRATEGIES = {
+    "base": BASE_CONFIG,
+    "aggressive": AGGRESSIVE_CONFIG,
+    "conservative": CONSERVATIVE_CONFIG
+}
@@ -1,19 +1,11 @@
-def apply_discounts(df, price):
+from pricing_engine.constraints.rules import PricingRules, DISCOUNT_RULES
 
-    discount = 0.0
+def apply_discounts(df, price, max_discount=0.25, rules=DISCOUNT_RULES):
 
-    # loyalty
-    discount += 0.05 * (df["tenure"] > 3).astype(int)
-
-    # High excess discount
-    discount += 0.03 * (df["excess"].astype(int) >= 1000).astype(int)
-
-    # NCD 
-    discount += df["ncd"].astype(int) / 200
-
-    # Cap total discount at 25% PER POLICY
-    discount = discount.clip(upper=0.25)
+    # loyalty, high excess and NCD discounts, capped PER POLICY
+    engine = PricingRules([], rules, max_discount=max_discount, cap=0.0, collar=0.0)
+    discount = engine.discount(df)
 
     final_price = price * (1 - discount)
 
-    return final_price
\ No newline at end of file
+    return final_price
@@ -0,0 +1,201 @@
+import numpy as np
+
+from pricing_engine.data.schema import CATEGORY_LEVELS, category_codes
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# declarative pricing rules, compiled once per strategy config and then
+# evaluated over the whole book in a single pass:
+#   decline rules    - any group whose conditions all hold declines the policy
+#   discount rules   - flat amounts when a condition holds, or a per-unit rate
+#   caps & collars   - price movement vs previous price (max_cap / min_collar)
+#   discount cap     - total discount per policy (max_discount)
+# a condition is (column, op, value); categorical values are compared on codes
+
+UNDERWRITING_RULES = [
+    # decline for unhealthy members
+    [("age", ">", 85)],
+    [("smoker", "==", "Y"), ("bmi", "==", "Obese")],
+    [("tenure", "<", 0.1)],
+]
+
+DISCOUNT_RULES = [
+    {"name": "loyalty", "when": ("tenure", ">", 3), "amount": 0.05},
+    {"name": "high_excess", "when": ("excess", ">=", 1000), "amount": 0.03},
+    {"name": "ncd", "rate": ("ncd", 1 / 200)},
+]
+
+OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def _compile_condition(condition):
+    col, op, value = condition
+    if op not in OPS:
+        raise ValueError(f"Unknown rule operator: {op}")
+    if col in CATEGORY_LEVELS:
+        value = CATEGORY_LEVELS[col].index(value)
+    return col, op, value
+
+
+class PricingRules:
+
+    def __init__(self, decline_rules, discount_rules, max_discount, cap, collar, backend="auto"):
+        self.decline_rules = [[_compile_condition(c) for c in group] for group in decline_rules]
+
+        self.flat_discounts = []
+        self.rate_discounts = []
+        for rule in discount_rules:
+            if "when" in rule:
+                self.flat_discounts.append((_compile_condition(rule["when"]), rule["amount"]))
+            else:
+                self.rate_discounts.append(rule["rate"])
+
+        self.max_discount = max_discount
+        self.cap = cap
+        self.collar = collar
+
+        if backend == "auto":
+            backend = "numexpr" if numexpr is not None else "numpy"
+        if backend == "numexpr" and numexpr is None:
+            raise ImportError("numexpr backend requested but numexpr is not installed")
+        if backend not in ("numpy", "numexpr"):
+            raise ValueError(f"Unknown rules backend: {backend}")
+        self.backend = backend
+
+        self.columns = sorted(
+            {c[0] for group in self.decline_rules for c in group}
+            | {c[0] for c, _ in self.flat_discounts}
+            | {col for col, _ in self.rate_discounts}
+        )
+
+        if backend == "numexpr":
+            self._decline_expr = self._build_decline_expr()
+            self._discount_expr = self._build_discount_expr()
+
+    # inputs ----------------------------------------------------------------
+
+    def _inputs(self, df):
+        # plain ndarrays (codes for categoricals); numeric columns are not copied
+        inputs = {}
+        for col in self.columns:
+            if col in CATEGORY_LEVELS:
+                inputs[col] = category_codes(df[col], col)
+            else:
+                inputs[col] = df[col].to_numpy()
+        return inputs
+
+    # numexpr ---------------------------------------------------------------
+
+    def _build_decline_expr(self):
+        if not self.decline_rules:
+            return None
+        groups = [
+            "(" + " & ".join(f"({col} {op} {value!r})" for col, op, value in group) + ")"
+            for group in self.decline_rules
+        ]
+        return " | ".join(groups)
+
+    def _build_discount_expr(self):
+        terms = [
+            f"where({col} {op} {value!r}, {amount!r}, 0.0)"
+            for (col, op, value), amount in self.flat_discounts
+        ]
+        terms += [f"{col} * {rate!r}" for col, rate in self.rate_discounts]
+        discount = " + ".join(terms) if terms else "0.0"
+        return f"where(({discount}) > {self.max_discount!r}, {self.max_discount!r}, {discount})"
+
+    # evaluation ------------------------------------------------------------
+
+    def decline(self, df, inputs=None):
+        inputs = self._inputs(df) if inputs is None else inputs
+        n = len(df)
+
+        if self.backend == "numexpr":
+            if self._decline_expr is None:
+                return np.zeros(n, dtype=bool)
+            return numexpr.evaluate(self._decline_expr, local_dict=inputs)
+
+        decline = np.zeros(n, dtype=bool)
+        group_mask = np.empty(n, dtype=bool)
+        cond = np.empty(n, dtype=bool)
+        for group in self.decline_rules:
+            group_mask.fill(True)
+            for col, op, value in group:
+                OPS[op](inputs[col], value, out=cond)
+                np.logical_and(group_mask, cond, out=group_mask)
+            np.logical_or(decline, group_mask, out=decline)
+        return decline
+
+    def discount(self, df, inputs=None):
+        inputs = self._inputs(df) if inputs is None else inputs
+        n = len(df)
+
+        if self.backend == "numexpr":
+            return np.broadcast_to(
+                numexpr.evaluate(self._discount_expr, local_dict=inputs), (n,)
+            ).astype(np.float64, copy=False)
+
+        discount = np.zeros(n, dtype=np.float64)
+        cond = np.empty(n, dtype=bool)
+        for (col, op, value), amount in self.flat_discounts:
+            OPS[op](inputs[col], value, out=cond)
+            np.add(discount, amount, out=discount, where=cond)
+        for col, rate in self.rate_discounts:
+            discount += inputs[col] * rate
+        np.minimum(discount, self.max_discount, out=discount)
+        return discount
+
+    def quotable(self, df):
+        return ~self.decline(df)
+
+    def apply(self, df, price, previous_price, declined_price=None):
+        # returns (quotable, final_price); declined_price (e.g. np.nan)
+        # overwrites the price of declined policies
+        inputs = self._inputs(df)
+        price = np.asarray(price, dtype=np.float64)
+        previous_price = np.asarray(previous_price, dtype=np.float64)
+
+        decline = self.decline(df, inputs)
+
+        if self.backend == "numexpr":
+            inputs = dict(inputs, price=price, previous_price=previous_price)
+            lo = f"(previous_price * {1 + self.collar!r})"
+            hi = f"(previous_price * {1 + self.cap!r})"
+            capped = f"where(price > {hi}, {hi}, where(price < {lo}, {lo}, price))"
+            final_price = numexpr.evaluate(
+                f"{capped} * (1 - {self._discount_expr})", local_dict=inputs
+            )
+        else:
+            final_price = np.clip(
+                price,
+                previous_price * (1 + self.collar),
+                previous_price * (1 + self.cap)
+            )
+            final_price *= 1 - self.discount(df, inputs)
+
+        if declined_price is not None:
+            final_price[decline] = declined_price
+
+        return ~decline, final_price
+
+
+def compile_rules(config, decline_rules=UNDERWRITING_RULES, discount_rules=DISCOUNT_RULES, backend="auto"):
+    # parameters come from the strategy config (see config/base.py)
+    return PricingRules(
+        decline_rules,
+        discount_rules,
+        max_discount=config["max_discount"],
+        cap=config["max_cap"],
+        collar=config["min_collar"],
+        backend=backend
+    )
@@ -1,8 +1,6 @@
-def apply_underwriting_rules(df):
-    # decline for unhealthy members
-    decline = (
-        (df["age"] > 85) |
-        ((df["smoker"] == "Y") & (df["bmi"] == "Obese")) |
-        (df["tenure"] < 0.1)
-    )
-    return ~decline
\ No newline at end of file
+from pricing_engine.constraints.rules import PricingRules, UNDERWRITING_RULES
+
+def apply_underwriting_rules(df, rules=UNDERWRITING_RULES):
+    # decline for unhealthy members (see constraints/rules.py)
+    engine = PricingRules(rules, [], max_discount=0.0, cap=0.0, collar=0.0)
+    return engine.quotable(df)
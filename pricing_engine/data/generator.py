@@ -1,85 +1,142 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
 
-rng = np.random.default_rng(seed = 100)
+from pricing_engine.data.schema import (
+    GENDER_LEVELS, REGION_LEVELS, SMOKER_LEVELS, BMI_LEVELS,
+    PLAN_LEVELS, NCD_LEVELS, EXCESS_LEVELS, POLICY_DTYPES
+)
+from pricing_engine.profiling import profiled
+
+# the book is generated in fixed-size blocks, each with its own
+# SeedSequence child, so the output depends only on (seed, n) and not on
+# how many threads fill the blocks
+BLOCK_SIZE = 250_000
+
+CODE_COLUMNS = ["gender", "region", "smoker", "bmi", "plan"]
+
+def choose_category(rng, levels, p, out):
+    # draws codes straight into the int8 slice (same stream as choosing from the labels)
+    out[:] = rng.choice(len(levels), size = len(out), p = p)
 
-def generate_policy_data(n=1_000_000):
+def draw_policy_block(rng, out):
+
+    # out maps each column to its slice of the preallocated book; columns are
+    # drawn one at a time and written in place, so only one column's draws
+    # are alive at once
+    n = len(out["age"])
 
     #age = rng.integers(0, 90, size = n)
     #age = np.clip(
     #    rng.normal(45, 18, size=n), 
     #    1, 100).astype(int)
     
-    mix = rng.choice([0, 1], size=n, p=[0.25, 0.75])
-
-    age = np.where(
-        mix == 0,
-        rng.normal(10, 6, size=n),    # children
-        rng.normal(48, 15, size=n)    # adults
+    # mixture of children and adults; the mask is kept as bools and the
+    # adult draws are copied over the child draws, so no int64 mix or
+    # np.where result is held next to the two normal draws
+    adult = rng.choice([0, 1], size=n, p=[0.25, 0.75]) == 1
+
+    age = rng.normal(10, 6, size=n)    # children
+    np.copyto(age, rng.normal(48, 15, size=n), where=adult)    # adults
+    del adult
+
+    # the int8 slice truncates as astype(np.int8) did
+    out["age"][:] = np.clip(age, 0, 100, out=age)
+    del age
+
+    choose_category(
+        rng,
+        GENDER_LEVELS,
+        p = [0.45, 0.55],
+        out = out["gender"]
     )
 
-    age = np.clip(age, 0, 100).astype(int)
-
-    gender = rng.choice(
-        ['M', 'F'],
-        size = n,
-        p = [0.45, 0.55]
-    )
-
-    region = rng.choice(
-        ['South West', 'South East', 'London', 'East of England', 'West Midlands', 'East Midlands', 'North West', 'North East', 'Yorkshire and the Humber', 'Wales', 'Scotland', 'Northern Ireland'],
-        size = n,
-        p = [0.1, 0.1, 0.3, 0.05, 0.05, 0.1, 0.05, 0.06, 0.05, 0.06, 0.07, 0.01]
+    choose_category(
+        rng,
+        REGION_LEVELS,
+        p = [0.1, 0.1, 0.3, 0.05, 0.05, 0.1, 0.05, 0.06, 0.05, 0.06, 0.07, 0.01],
+        out = out["region"]
     )
 
     
     tenure = rng.exponential(scale=4, size = n)
-    tenure = np.clip(tenure, 0, 30)
-
-    smoker = rng.choice(
-        ['Y', 'N'],
-        size = n,
-        p = [0.15, 0.85]
+    np.clip(tenure, 0, 30, out=out["tenure"])
+    del tenure
+
+    choose_category(
+        rng,
+        SMOKER_LEVELS,
+        p = [0.15, 0.85],
+        out = out["smoker"]
     )
 
-    bmi = rng.choice(
-        ['Underweight', 'Normal', 'Overweight', 'Obese'],
-        size = n,
-        p = [0.05, 0.40, 0.35, 0.20]
+    choose_category(
+        rng,
+        BMI_LEVELS,
+        p = [0.05, 0.40, 0.35, 0.20],
+        out = out["bmi"]
     )
 
-    plan = rng.choice(
-        ['Budget', 'Standard', 'Premium'],
-        size = n,
-        p = [0.1, 0.4, 0.5]
+    choose_category(
+        rng,
+        PLAN_LEVELS,
+        p = [0.1, 0.4, 0.5],
+        out = out["plan"]
     )
 
     # not realistic, low tenures won't be able to have high NCD
-    ncd = rng.choice(
-        ["0", '10', '20', '30'],
+    out["ncd"][:] = rng.choice(
+        np.array(NCD_LEVELS, dtype=np.int16),
         size = n,
         p = [0.1, 0.2, 0.4, 0.3]
     )    
 
-    excess = rng.choice(
-        ['0', '250', '500', '1000', '2000'],
+    out["excess"][:] = rng.choice(
+        np.array(EXCESS_LEVELS, dtype=np.int16),
          size = n,
          p = [0.4, 0.2, 0.2, 0.1, 0.1]
     )
 
  #   is_renewal = np.random.binomial(1, 0.6, size = n)
 
-    df = pd.DataFrame({
-        "age": age,
-        "gender": gender,
-        "region": region,
-        "tenure": tenure,
-        "smoker": smoker,
-        "bmi": bmi,
-        "plan": plan,
-        "ncd": ncd,
-        'excess': excess,
-#        'is_renewal': is_renewal
-    })
+@profiled
+def generate_policy_data(n=1_000_000, seed=100, workers=None, block_size=BLOCK_SIZE):
+
+    # preallocated output; categorical columns hold int8 codes until the end
+    columns = {
+        col: np.empty(n, dtype=np.int8 if col in CODE_COLUMNS else POLICY_DTYPES[col])
+        for col in POLICY_DTYPES
+    }
+
+    starts = range(0, n, block_size)
+    # seed is an int or a SeedSequence (the streaming pipeline spawns one per chunk)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    block_seeds = seed.spawn(len(starts))
+
+    def fill_block(start, block_seed):
+        stop = min(start + block_size, n)
+        draw_policy_block(
+            np.random.default_rng(block_seed),
+            {col: values[start:stop] for col, values in columns.items()}
+        )
+
+    if workers is None:
+        workers = min(len(starts), os.cpu_count() or 1)
+
+    if workers <= 1:
+        for start, block_seed in zip(starts, block_seeds):
+            fill_block(start, block_seed)
+    else:
+        # NumPy's generators release the GIL while filling arrays
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fill_block, starts, block_seeds))
+
+    for col in CODE_COLUMNS:
+        columns[col] = pd.Categorical.from_codes(columns[col], dtype=POLICY_DTYPES[col])
+
+    df = pd.DataFrame(columns, copy=False)
 
     return df 
@@ -1,6 +1,42 @@
 from dataclasses import dataclass
 from typing import Literal
 
+import numpy as np
+import pandas as pd
+
+# category levels; the order fixes the integer codes used downstream
+GENDER_LEVELS = ["M", "F"]
+REGION_LEVELS = [
+    "South West", "South East", "London", "East of England", "West Midlands",
+    "East Midlands", "North West", "North East", "Yorkshire and the Humber",
+    "Wales", "Scotland", "Northern Ireland"
+]
+SMOKER_LEVELS = ["Y", "N"]
+BMI_LEVELS = ["Underweight", "Normal", "Overweight", "Obese"]
+PLAN_LEVELS = ["Budget", "Standard", "Premium"]
+NCD_LEVELS = [0, 10, 20, 30]
+EXCESS_LEVELS = [0, 250, 500, 1000, 2000]
+
+CATEGORY_LEVELS = {
+    "gender": GENDER_LEVELS,
+    "region": REGION_LEVELS,
+    "smoker": SMOKER_LEVELS,
+    "bmi": BMI_LEVELS,
+    "plan": PLAN_LEVELS,
+}
+
+POLICY_DTYPES = {
+    "age": np.int8,
+    "gender": pd.CategoricalDtype(GENDER_LEVELS),
+    "region": pd.CategoricalDtype(REGION_LEVELS),
+    "tenure": np.float32,
+    "smoker": pd.CategoricalDtype(SMOKER_LEVELS),
+    "bmi": pd.CategoricalDtype(BMI_LEVELS),
+    "plan": pd.CategoricalDtype(PLAN_LEVELS),
+    "ncd": np.int16,
+    "excess": np.int16,
+}
+
 
 @dataclass
 class PolicySchema:
@@ -11,10 +47,70 @@ class PolicySchema:
     smoker: Literal["Y", "N"]
     bmi: Literal["Underweight", "Normal", "Overweight", "Obese"]
     plan: Literal["Budget", "Standard", "Premium"]
-    ncd: Literal["0", "10", "20", "30"]
-    excess: Literal["0", "250", "500", "1000", "2000"]
+    ncd: Literal[0, 10, 20, 30]
+    excess: Literal[0, 250, 500, 1000, 2000]
+
+
+def category_codes(series, col):
+    # small-int codes for a categorical policy column; string columns
+    # (e.g. an older CSV book) are encoded on the fly
+    levels = CATEGORY_LEVELS[col]
+    if isinstance(series.dtype, pd.CategoricalDtype) and list(series.cat.categories) == levels:
+        codes = series.cat.codes.to_numpy()
+    else:
+        codes = pd.Categorical(series, categories=levels).codes
+
+    if (codes < 0).any():
+        raise ValueError(f"{col} has values outside {levels}")
+    return codes
+
+
+def level_code(col, value):
+    return CATEGORY_LEVELS[col].index(value)
+
+
+def is_level(series, col, value):
+    # boolean array, compared on codes rather than strings
+    return category_codes(series, col) == level_code(col, value)
+
+
+def dummy_column(df, name):
+    # the get_dummies column `name` (e.g. "plan_Standard") as a bool array,
+    # read off the category codes; None if name is not a category dummy
+    col, _, level = name.partition("_")
+    if col not in CATEGORY_LEVELS or level not in CATEGORY_LEVELS[col]:
+        return None
+    return category_codes(df[col], col) == level_code(col, level)
+
+
+def _check_int_range(series, col, dtype):
+    # astype to a narrow int wraps out-of-range values and turns NaN into
+    # garbage, so anything that does not fit is refused before the cast
+    info = np.iinfo(dtype)
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    bad = ~np.isfinite(values) | (values < info.min) | (values > info.max)
+    if bad.any():
+        raise ValueError(
+            f"{col} has {bad.sum()} missing, non-numeric or out-of-range values "
+            f"(e.g. {series[bad].tolist()[0]!r}); {np.dtype(dtype).name} holds {info.min}..{info.max}"
+        )
+
+
+def to_policy_frame(df):
+    # cast a policy frame (strings / numeric strings / wide ints) to the compact
+    # schema; a frame already in it is returned as is
+    casts = {c: t for c, t in POLICY_DTYPES.items() if c in df.columns and df[c].dtype != t}
+    for col, dtype in casts.items():
+        if not isinstance(dtype, pd.CategoricalDtype) and np.issubdtype(dtype, np.integer):
+            _check_int_range(df[col], col, dtype)
+    return df.astype(casts) if casts else df
+
 
 def validate_policy_df(df):
     assert df["age"].between(0, 100).all()
     assert df["tenure"].between(0, 30).all()
-    assert df["smoker"].isin(["Y", "N"]).all()
\ No newline at end of file
+    assert df["smoker"].isin(SMOKER_LEVELS).all()
+    for col in CATEGORY_LEVELS:
+        assert df[col].dtype == POLICY_DTYPES[col], col
+    assert df["ncd"].isin(NCD_LEVELS).all()
+    assert df["excess"].isin(EXCESS_LEVELS).all()
@@ -1,16 +1,64 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pricing_engine.model_cache import hash_values
+from pricing_engine.profiling import profiled
+
+# plots are rendered with matplotlib's object-oriented Agg API (no pyplot
+# state), in a process pool, and skipped when the data behind a plot has
+# not changed since the last run. matplotlib / seaborn are only imported
+# when something is actually drawn.
 
+PLOT_MANIFEST = ".plot_hashes.json"
 
-def save_policy_records(policy_records, filename="policy_records.csv"):
-    policy_records.to_csv(filename, index=False)
+# bump when the plotting code changes so every plot is redrawn
+PLOT_VERSION = 1
+
+
+@profiled
+def save_policy_records(policy_records, filename="policy_records.parquet", compression="zstd"):
+    # Parquet by default; a name ending in .csv gives the CSV export.
+    # a CellResultStore becomes a dataset folder partitioned by cell
+    # (see experiments/results_store.py), written one cell at a time
+    folder = os.path.dirname(filename)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    as_csv = filename.endswith(".csv")
+    if isinstance(policy_records, pd.DataFrame):
+        if as_csv:
+            policy_records.to_csv(filename, index=False)
+        else:
+            policy_records.to_parquet(filename, index=False, compression=compression)
+    elif as_csv:
+        policy_records.to_csv(filename)
+    else:
+        policy_records.to_parquet(filename, compression=compression)
     print(f"Policy Records saved to {filename}")
 
 
-def save_experiment_results(results_df, filename="experiment_results.csv"):
-    results_df.to_csv(filename, index=False)
+def load_policy_records(path, columns=None):
+    # a dataset folder comes back as a lazy CellResultDataset,
+    # a single file as a DataFrame
+    if os.path.isdir(path):
+        from pricing_engine.experiments.results_store import CellResultDataset
+        return CellResultDataset(path)
+    return pd.read_parquet(path, columns=columns)
+
+
+@profiled
+def save_experiment_results(results_df, filename="experiment_results.parquet"):
+    folder = os.path.dirname(filename)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    if filename.endswith(".csv"):
+        results_df.to_csv(filename, index=False)
+    else:
+        results_df.to_parquet(filename, index=False)
     print(f"Experiment results saved to {filename}")
 
 
@@ -26,7 +74,18 @@ def pivot_metrics(results_df, metric_prefix):
     }
 
 
+def _new_axes(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
 def plot_experiment_results(pivot_table, metric_name="avg_price", output_folder="plots"):
+    import seaborn as sns
+
     os.makedirs(output_folder, exist_ok=True)
 
     #  ratios 
@@ -50,50 +109,130 @@ def plot_experiment_results(pivot_table, metric_name="avg_price", output_folder=
         else:
             return f"{int(round(x)):,}"
 
-    annot = pivot_table.applymap(format_value)
+    annot = pivot_table.map(format_value)
 
-    plt.figure(figsize=(10, 6))
+    fig, ax = _new_axes(figsize=(10, 6))
     sns.heatmap(
         pivot_table,
         annot=annot,
         fmt="",
-        cmap=cmap
+        cmap=cmap,
+        ax=ax
     )
 
-    plt.title(f"{metric_name.replace('_', ' ').title()} by Scenario x Strategy")
-    plt.ylabel("Scenario")
-    plt.xlabel("Strategy")
+    ax.set_title(f"{metric_name.replace('_', ' ').title()} by Scenario x Strategy")
+    ax.set_ylabel("Scenario")
+    ax.set_xlabel("Strategy")
 
     plot_file = os.path.join(output_folder, f"heatmap_{metric_name}.png")
-    plt.savefig(plot_file, bbox_inches="tight")
-    plt.close()
+    fig.savefig(plot_file, bbox_inches="tight")
 
     print(f"Heatmap saved to {plot_file}")
+    return plot_file
 
 
 def plot_price_change(results_df, output_folder="plots"):
+    import seaborn as sns
+
     os.makedirs(output_folder, exist_ok=True)
 
-    plt.figure(figsize=(10, 6))
+    fig, ax = _new_axes(figsize=(10, 6))
     sns.barplot(
         data=results_df,
         x="strategy_name",
         y="AvgPremium_actual",
-        hue="scenario"
+        hue="scenario",
+        ax=ax
     )
-    plt.title("Average Premium (Actual) by Strategy and Scenario")
-    plt.ylabel("Average Premium")
-    plt.savefig(os.path.join(output_folder, "avg_premium_actual.png"))
-    plt.close()
+    ax.set_title("Average Premium (Actual) by Strategy and Scenario")
+    ax.set_ylabel("Average Premium")
+
+    plot_file = os.path.join(output_folder, "avg_premium_actual.png")
+    fig.savefig(plot_file)
+    return plot_file
 
 
-def summarize_experiments(results_df, output_folder="plots"):
+def plot_hash(func, *args):
+    # content hash of everything a plot is drawn from
+    h = hashlib.sha256()
+    h.update(f"{func.__name__}:{PLOT_VERSION}".encode())
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            h.update(repr(list(arg.index)).encode())
+            h.update(repr(list(arg.columns)).encode())
+            hash_values(h, arg)
+        else:
+            h.update(repr(arg).encode())
+    return h.hexdigest()
+
+
+def _load_manifest(output_folder):
+    try:
+        with open(os.path.join(output_folder, PLOT_MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(output_folder, manifest):
+    path = os.path.join(output_folder, PLOT_MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+@profiled
+def render_plots(jobs, output_folder, workers=None):
+    # jobs: (name, func, args) with func(*args, output_folder) -> plot file.
+    # plots whose content hash matches the last run (and whose file still
+    # exists) are skipped; the rest are drawn in a process pool
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = _load_manifest(output_folder)
+
+    todo = []
+    for name, func, args in jobs:
+        digest = plot_hash(func, *args)
+        entry = manifest.get(name)
+        if entry and entry["hash"] == digest and os.path.exists(entry["file"]):
+            continue
+        todo.append((name, func, args, digest))
+
+    print(f"Plots: {len(jobs) - len(todo)} unchanged, {len(todo)} to render")
+    if not todo:
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(todo)))
+
+    if workers == 1:
+        files = [func(*args, output_folder) for _, func, args, _ in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(func, *args, output_folder) for _, func, args, _ in todo]
+            files = [future.result() for future in futures]
+
+    for (name, _, _, digest), plot_file in zip(todo, files):
+        manifest[name] = {"hash": digest, "file": plot_file}
+    _save_manifest(output_folder, manifest)
+
+
+@profiled
+def summarize_experiments(results_df, output_folder="plots", csv=False, plots=True, workers=None):
+    # pivots are cheap to rebuild from experiment_results.parquet, so they
+    # are only written out with the CSV export
     os.makedirs(output_folder, exist_ok=True)
 
     save_experiment_results(
         results_df,
-        filename=os.path.join(output_folder, "experiment_results.csv")
+        filename=os.path.join(output_folder, "experiment_results.parquet")
     )
+    if csv:
+        save_experiment_results(
+            results_df,
+            filename=os.path.join(output_folder, "experiment_results.csv")
+        )
 
     prefixes = [
         "GWP", "Claims", "Renewal",
@@ -102,12 +241,18 @@ def summarize_experiments(results_df, output_folder="plots"):
         "AVE"
     ]
 
+    jobs = []
     for prefix in prefixes:
         pivots = pivot_metrics(results_df, prefix)
         for name, pivot_df in pivots.items():
-            pivot_df.to_csv(
-                os.path.join(output_folder, f"pivot_{name}.csv")
-            )
-            plot_experiment_results(pivot_df, name, output_folder)
+            if csv:
+                pivot_df.to_csv(
+                    os.path.join(output_folder, f"pivot_{name}.csv")
+                )
+            jobs.append((f"heatmap_{name}", plot_experiment_results, (pivot_df, name)))
+
+    price_cols = ["strategy_name", "AvgPremium_actual", "scenario"]
+    jobs.append(("avg_premium_actual", plot_price_change, (results_df[price_cols],)))
 
-    plot_price_change(results_df, output_folder)
\ No newline at end of file
+    if plots:
+        render_plots(jobs, output_folder, workers=workers)
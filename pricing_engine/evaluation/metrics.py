@@ -1,24 +1,191 @@
+import numpy as np
 import pandas as pd
 
-def calculate_loss_ratio(df, price_col="final_price"):
+# segment KPIs are computed without copying the policy frame or running
+# Python per group: every KPI is a mean (or a ratio of sums) of a per-policy
+# measure, so each segment table is one bincount pass over integer group
+# ids built from the factorized segment columns. Several tables, including
+# multi-level cubes, share the measures computed once up front.
+
+# name -> (numerator, denominator, how)
+#   "mean"       mean of numerator / denominator per policy (NaNs skipped)
+#   "sum_ratio"  sum(numerator) / sum(denominator)
+SEGMENT_KPIS = {
+    "avg_loss_ratio": ("incurred", "final_price", "mean"),
+    "avg_premium": ("final_price", None, "mean"),
+    "acceptance_rate": ("accepted", None, "mean"),
+    "ave_ratio": ("incurred", "expected_burn_cost", "mean"),
+}
+
+AGE_BANDS = [0, 18, 30, 45, 60, 75, 200]
+AGE_BAND_LABELS = ["0-17", "18-29", "30-44", "45-59", "60-74", "75+"]
+
+
+def _age_band(df):
+    codes = np.searchsorted(AGE_BANDS, df["age"].to_numpy(), side="right") - 1
+    return codes, pd.Index(AGE_BAND_LABELS, name="age_band")
+
+
+# segments computed on the fly rather than stored on the frame
+DERIVED_SEGMENTS = {
+    "age_band": _age_band,
+}
+
+
+def _values(df, col):
+    return df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
 
-    df = df.copy()
-    df["loss_ratio"] = df["incurred"] / df[price_col]
+def loss_ratio(df, price_col="final_price"):
+    return _values(df, "incurred") / _values(df, price_col)
+
+
+def ave_ratio(df, expected_col="expected_burn_cost"):
+    return _values(df, "incurred") / _values(df, expected_col)
+
+
+def calculate_loss_ratio(df, price_col="final_price"):
+    # adds the column in place (no frame copy) and returns df
+    df["loss_ratio"] = loss_ratio(df, price_col)
     return df
 
-def calculate_ave_ratio(df, expected_col="expected_burn_cost", price_col="final_price"):
 
-    df = df.copy()
-    df["ave_ratio"] = df["incurred"] / df[expected_col]
-    df["premium_ratio"] = df[price_col] / df[expected_col]
+def calculate_ave_ratio(df, expected_col="expected_burn_cost", price_col="final_price"):
+    # adds the columns in place (no frame copy) and returns df
+    df["ave_ratio"] = ave_ratio(df, expected_col)
+    df["premium_ratio"] = _values(df, price_col) / _values(df, expected_col)
     return df
 
-def segment_kpis(df, segment_col="plan"):
 
-    grouped = df.groupby(segment_col).agg(
-        avg_loss_ratio=("incurred", lambda x: (x / df.loc[x.index, "final_price"]).mean()),
-        avg_premium=("final_price", "mean"),
-        acceptance_rate=("accepted", "mean"),
-        ave_ratio=("incurred", lambda x: (x / df.loc[x.index, "expected_burn_cost"]).mean())
-    )
-    return grouped
\ No newline at end of file
+def segment_codes(df, col):
+    # (int codes with -1 for missing, level labels) for a segment column
+    if col in DERIVED_SEGMENTS and col not in df.columns:
+        return DERIVED_SEGMENTS[col](df)
+
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), pd.Index(series.cat.categories, name=col)
+
+    codes, levels = pd.factorize(series, sort=True)
+    return codes, pd.Index(levels, name=col)
+
+
+def segment_groups(df, segments):
+    # (keys, inverse) over the segment combinations present in a batch:
+    # keys are tuples of labels (missing values -> None), inverse maps each
+    # row to its key. Used by the streaming monitors, whose segments are
+    # only known as batches arrive
+    if not segments:
+        return [()], np.zeros(len(df), dtype=np.int64)
+
+    group = np.zeros(len(df), dtype=np.int64)
+    levels = []
+    for col in segments:
+        codes, col_levels = segment_codes(df, col)
+        codes = np.where(codes < 0, len(col_levels), codes)
+        group = group * (len(col_levels) + 1) + codes
+        levels.append(list(col_levels) + [None])
+
+    ids, inverse = np.unique(group, return_inverse=True)
+    positions = np.unravel_index(ids, [len(l) for l in levels])
+    keys = list(zip(*[[l[i] for i in pos] for l, pos in zip(levels, positions)]))
+    return keys, inverse
+
+
+def kpi_measures(df, kpis=SEGMENT_KPIS):
+    # per-policy measure arrays, computed once and shared by every table
+    measures = {}
+    for name, (num, den, how) in kpis.items():
+        values = _values(df, num)
+        if den is not None and how == "mean":
+            values = values / _values(df, den)
+            measures[name] = (values, None, how)
+        else:
+            measures[name] = (values, None if den is None else _values(df, den), how)
+    return measures
+
+
+def segment_cube(df, segments, kpis=SEGMENT_KPIS, measures=None, codes=None):
+    # KPIs for every observed combination of `segments` (one or more columns)
+    if isinstance(segments, str):
+        segments = [segments]
+    measures = kpi_measures(df, kpis) if measures is None else measures
+    codes = {} if codes is None else codes
+
+    # group ids are mixed-radix over the level counts; once the id space
+    # would outgrow the book they are compacted to the observed
+    # combinations (np.unique keeps their order), so memory follows the
+    # combinations present rather than the product of all level counts,
+    # and a dozen wide dimensions cannot overflow int64
+    max_groups = max(2 * len(df), 2 ** 16)
+    levels = []
+    group = np.zeros(len(df), dtype=np.int64)
+    n_groups = 1
+    valid = np.ones(len(df), dtype=bool)
+    for col in segments:
+        if col not in codes:
+            codes[col] = segment_codes(df, col)
+        col_codes, col_levels = codes[col]
+        valid &= col_codes >= 0
+        if n_groups * len(col_levels) > max_groups:
+            _, group = np.unique(group, return_inverse=True)
+            n_groups = int(group.max()) + 1 if len(group) else 1
+        # invalid rows go to their own bucket below, so their code is irrelevant
+        group = group * len(col_levels) + np.maximum(col_codes, 0)
+        n_groups *= len(col_levels)
+        levels.append(col_levels)
+
+    group = np.where(valid, group, n_groups)
+    size = n_groups + 1
+
+    counts = np.bincount(group, minlength=size)[:n_groups]
+    observed = np.flatnonzero(counts)
+
+    out = {"n_policies": counts[observed]}
+    for name, (values, den, how) in measures.items():
+        if how == "mean":
+            ok = ~np.isnan(values)
+            total = np.bincount(group, weights=np.where(ok, values, 0.0), minlength=size)
+            n = np.bincount(group, weights=ok, minlength=size)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out[name] = (total / n)[observed]
+        elif how == "sum_ratio":
+            num_total = np.bincount(group, weights=np.nan_to_num(values), minlength=size)
+            den_total = np.bincount(group, weights=np.nan_to_num(den), minlength=size)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out[name] = (num_total / den_total)[observed]
+        else:
+            raise ValueError(f"Unknown KPI aggregation: {how}")
+
+    if len(levels) == 1:
+        index = levels[0][observed]
+    else:
+        # labels from one row of each observed group
+        row = np.empty(n_groups, dtype=np.int64)
+        row[group[valid]] = np.flatnonzero(valid)
+        row = row[observed]
+        index = pd.MultiIndex.from_arrays(
+            [l[codes[col][0][row]] for l, col in zip(levels, segments)]
+        )
+    return pd.DataFrame(out, index=index)
+
+
+def segment_kpi_tables(df, specs, kpis=SEGMENT_KPIS):
+    # {spec: table} for many segmentations in one go; a spec is a column
+    # name or a tuple of columns (a multi-level cube). Measures and each
+    # column's codes are computed once.
+    measures = kpi_measures(df, kpis)
+    codes = {}
+    return {
+        spec: segment_cube(
+            df,
+            list(spec) if isinstance(spec, tuple) else [spec],
+            measures=measures,
+            codes=codes
+        )
+        for spec in specs
+    }
+
+
+def segment_kpis(df, segment_col="plan"):
+    return segment_cube(df, [segment_col]).drop(columns="n_policies")
@@ -1,3 +1,5 @@
+import os
+
 import pandas as pd
 
 def generate_summary_report(df, segment_col="plan", filename='Report'):
@@ -11,18 +13,48 @@ def generate_summary_report(df, segment_col="plan", filename='Report'):
     
     return report
 
-def generate_overall_report(df, price_col="final_price", accept_col="quotable", expenses=0):
-    accepted_mask = df[accept_col].astype(bool)
+def generate_segment_reports(df, specs=("plan", "region", "age_band"), folder=None):
+    # several segment tables (a spec is a column or a tuple of columns for
+    # a multi-level cube) from one set of KPI measures
 
-    portfolio_ltv = (
-        df.loc[accepted_mask, price_col].sum()
-        - df.loc[accepted_mask, "incurred"].sum()
-        - expenses * accepted_mask.sum()
-    )
+    from pricing_engine.evaluation.metrics import segment_kpi_tables
+    reports = segment_kpi_tables(df, specs)
+
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+        for spec, report in reports.items():
+            name = "_x_".join(spec) if isinstance(spec, tuple) else spec
+            report.to_csv(os.path.join(folder, f"segment_kpis_{name}.csv"))
+
+    return reports
+
+def overall_report_totals(df, price_col="final_price", accept_col="quotable"):
+    # additive pieces of the overall report, so chunks can be summed
+    accepted_mask = df[accept_col].astype(bool)
 
     return {
-        "portfolio_ltv": portfolio_ltv,
+        "n_accepted": int(accepted_mask.sum()),
         "gwp": df.loc[accepted_mask, price_col].sum(),
         "claims": df.loc[accepted_mask, "incurred"].sum(),
-        "loss_ratio": df.loc[accepted_mask, "incurred"].sum() / df.loc[accepted_mask, price_col].sum()
-    }
\ No newline at end of file
+    }
+
+def combine_overall_reports(totals, expenses=0):
+    # totals: iterable of overall_report_totals dicts
+    n_accepted, gwp, claims = 0, 0.0, 0.0
+    for t in totals:
+        n_accepted += t["n_accepted"]
+        gwp += t["gwp"]
+        claims += t["claims"]
+
+    return {
+        "portfolio_ltv": gwp - claims - expenses * n_accepted,
+        "gwp": gwp,
+        "claims": claims,
+        "loss_ratio": claims / gwp
+    }
+
+def generate_overall_report(df, price_col="final_price", accept_col="quotable", expenses=0):
+    return combine_overall_reports(
+        [overall_report_totals(df, price_col, accept_col)],
+        expenses
+    )
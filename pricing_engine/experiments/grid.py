@@ -0,0 +1,93 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# scenario x strategy grid executor
+# the shared policy frame is written once to memory-mapped .npy files and
+# every worker maps it at start-up, so tasks only carry the cell parameters
+
+
+def share_frame(df, folder):
+    # one .npy per column; categorical and object columns are stored as
+    # int codes plus the categories / uniques needed to rebuild them
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        decode = None
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.cat.codes.to_numpy()
+            decode = series.dtype
+        elif series.dtype == object:
+            values, uniques = pd.factorize(series.to_numpy())
+            decode = list(uniques)
+        else:
+            values = series.to_numpy()
+
+        path = os.path.join(folder, f"col_{i}.npy")
+        np.save(path, values)
+        columns.append((col, path, decode))
+
+    return {"columns": columns}
+
+
+def load_shared_frame(spec):
+    data = {}
+    for col, path, decode in spec["columns"]:
+        values = np.load(path, mmap_mode="r")
+        if isinstance(decode, pd.CategoricalDtype):
+            values = pd.Categorical.from_codes(values, dtype=decode)
+        elif decode is not None:
+            values = np.asarray(decode, dtype=object)[values]
+        data[col] = values
+    return pd.DataFrame(data, copy=False)
+
+
+_worker_frame = None
+
+
+def _init_worker(spec):
+    global _worker_frame
+    _worker_frame = load_shared_frame(spec)
+
+
+def _run_worker_cell(cell_func, index, cell, seed):
+    return index, cell_func(_worker_frame, cell, seed)
+
+
+def cell_seeds(n_cells, seed):
+    # independent stream per cell, fixed by grid position not by worker
+    return np.random.SeedSequence(seed).spawn(n_cells)
+
+
+def run_grid(df, cells, cell_func, workers=None, seed=0):
+    # cell_func(df, cell, seed) -> result; results come back in grid order
+    seeds = cell_seeds(len(cells), seed)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(cells)))
+
+    if workers == 1:
+        return [cell_func(df, cell, s) for cell, s in zip(cells, seeds)]
+
+    results = [None] * len(cells)
+    with tempfile.TemporaryDirectory(prefix="pricing_grid_") as folder:
+        spec = share_frame(df, folder)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(spec,)
+        ) as pool:
+            futures = [
+                pool.submit(_run_worker_cell, cell_func, i, cell, s)
+                for i, (cell, s) in enumerate(zip(cells, seeds))
+            ]
+            for future in futures:
+                index, result = future.result()
+                results[index] = result
+
+    return results
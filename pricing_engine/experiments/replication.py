@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+
+from pricing_engine.pricing.simulate_demand import DEMAND_NOISE_SD
+from pricing_engine.streaming_stats import RunningStats, QuantileSketch
+from pricing_engine.monitoring.ave import summary_metrics
+
+# Monte Carlo replication of a priced grid cell: prices stay fixed, and
+# claims and renewals are redrawn R times. Replications are drawn as
+# (replications x policies) blocks, reduced to a handful of per-replication
+# totals, turned into the cell's summary metrics and folded into running
+# mean / variance and quantile sketches, so memory depends on the block
+# sizes, not on R or the size of the book.
+#
+# the per-block streams are spawned from the cell seed, so results are
+# reproducible for a given (seed, rep_block, policy_block).
+
+REP_BLOCK = 16
+POLICY_BLOCK = 131_072
+
+TOTALS = ["p_sum", "ep", "ec", "n_acc", "ap", "ac"]
+
+
+def draw_block_totals(rng, n_reps, lam, severity_scale, utility, price):
+    # one (n_reps x policies) block -> per-replication totals
+    n = len(price)
+
+    # sum of k Gamma(2, s) claims is Gamma(2k, s), so one draw per policy
+    n_claims = rng.poisson(lam, size=(n_reps, n))
+    incurred = np.zeros((n_reps, n))
+    claimants = n_claims > 0
+    incurred[claimants] = rng.gamma(
+        2.0 * n_claims[claimants],
+        np.broadcast_to(severity_scale, (n_reps, n))[claimants]
+    )
+
+    p = rng.normal(0.0, DEMAND_NOISE_SD, size=(n_reps, n))
+    p += utility
+    expit(p, out=p)
+    accepted = rng.random((n_reps, n)) < p
+
+    return {
+        "p_sum": p.sum(axis=1),
+        "ep": p @ price,
+        "ec": np.einsum("ij,ij->i", p, incurred),
+        "n_acc": accepted.sum(axis=1),
+        "ap": np.where(accepted, price, 0.0).sum(axis=1),
+        "ac": np.where(accepted, incurred, 0.0).sum(axis=1),
+    }
+
+
+def replicate_cell(
+    risk,
+    claims_inflation,
+    utility,
+    final_price,
+    replications,
+    seed=None,
+    base_severity=600,
+    rep_block=REP_BLOCK,
+    policy_block=POLICY_BLOCK
+):
+    # returns (RunningStats over the metric vector, {metric: QuantileSketch}, metric names)
+    risk = np.asarray(risk, dtype=np.float64)
+    utility = np.asarray(utility, dtype=np.float64)
+    price = np.asarray(final_price, dtype=np.float64)
+    n = len(price)
+
+    # same claims model as risk/simulate_claims.draw_claims, inflated
+    lam = np.exp(-3.5 + 0.4 * risk)
+    severity_scale = base_severity * risk / 2.0 * claims_inflation
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    names = None
+    stats = RunningStats()
+    sketches = None
+
+    rep_starts = range(0, replications, rep_block)
+    for rep_start, block_seed in zip(rep_starts, seed.spawn(len(rep_starts))):
+        n_reps = min(rep_block, replications - rep_start)
+        totals = {k: np.zeros(n_reps) for k in TOTALS}
+
+        policy_starts = range(0, n, policy_block)
+        for start, chunk_seed in zip(policy_starts, block_seed.spawn(len(policy_starts))):
+            rows = slice(start, start + policy_block)
+            chunk = draw_block_totals(
+                np.random.default_rng(chunk_seed),
+                n_reps,
+                lam[rows],
+                severity_scale[rows],
+                utility[rows],
+                price[rows]
+            )
+            for k in TOTALS:
+                totals[k] += chunk[k]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            metrics = summary_metrics(n, **totals)
+
+        if names is None:
+            names = list(metrics)
+            sketches = {name: QuantileSketch() for name in names}
+
+        stats.update(np.column_stack([metrics[name] for name in names]))
+        for name in names:
+            sketches[name].update(metrics[name])
+
+    return stats, sketches, names
+
+
+def confidence_table(stats, sketches, names, level=0.95):
+    # one row per metric: mean with a t interval for the mean, and the
+    # central `level` range of the replications from the quantile sketch
+    from scipy.stats import t as student_t
+
+    alpha = 1 - level
+    crit = student_t.ppf(1 - alpha / 2, stats.count - 1) if stats.count > 1 else np.nan
+
+    rows = []
+    for i, name in enumerate(names):
+        mean = stats.mean[i]
+        sem = stats.sem[i]
+        q_low, q_high = sketches[name].quantile([alpha / 2, 1 - alpha / 2])
+        rows.append({
+            "metric": name,
+            "replications": stats.count,
+            "mean": mean,
+            "std": stats.std[i],
+            "ci_low": mean - crit * sem,
+            "ci_high": mean + crit * sem,
+            "q_low": q_low,
+            "q_high": q_high,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# per-cell experiment outputs, kept as one dict of NumPy arrays per
+# (scenario, strategy) cell so the base policy frame never widens.
+#
+# on disk the cells go to a Parquet dataset partitioned by cell,
+#   <folder>/scenario=<name>/strategy_name=<name>/*.parquet
+# read back lazily with CellResultDataset. CSV stays as an export.
+
+PARTITION_COLUMNS = ["scenario", "strategy_name"]
+
+
+class CellResultStore:
+
+    def __init__(self, n_policies):
+        self.n_policies = n_policies
+        self._cells = {}
+
+    def add(self, scenario, strategy_name, columns):
+        arrays = {}
+        for col, values in columns.items():
+            values = np.asarray(values)
+            if len(values) != self.n_policies:
+                raise ValueError(
+                    f"{col} has {len(values)} rows, expected {self.n_policies}"
+                )
+            arrays[col] = values
+        self._cells[(scenario, strategy_name)] = arrays
+
+    def get(self, scenario, strategy_name):
+        return self._cells[(scenario, strategy_name)]
+
+    def cells(self):
+        return list(self._cells)
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        return iter(self._cells.items())
+
+    def cell_frame(self, scenario, strategy_name):
+        # long-format slice for one cell, keyed back to the base frame by policy_id
+        frame = pd.DataFrame(self.get(scenario, strategy_name), copy=False)
+        frame.insert(0, "strategy_name", strategy_name)
+        frame.insert(0, "scenario", scenario)
+        frame.insert(0, "policy_id", np.arange(self.n_policies))
+        return frame
+
+    def to_csv(self, filename):
+        # streams one cell at a time, never materialising the whole grid
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        header = True
+        for scenario, strategy_name in self.cells():
+            self.cell_frame(scenario, strategy_name).to_csv(
+                filename, mode="w" if header else "a", header=header, index=False
+            )
+            header = False
+
+    def to_parquet(self, folder, compression="zstd", row_group_size=1_000_000):
+        # one cell at a time into a hive-partitioned dataset; typed columns,
+        # row-group statistics on by default
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        cells = self.cells()
+        if not cells:
+            raise ValueError("No cells to write")
+
+        def cell_table(scenario, strategy_name):
+            columns = {"policy_id": np.arange(self.n_policies, dtype=np.int32)}
+            columns.update(self.get(scenario, strategy_name))
+            columns["scenario"] = np.full(self.n_policies, scenario, dtype=object)
+            columns["strategy_name"] = np.full(self.n_policies, strategy_name, dtype=object)
+            return pa.table(columns)
+
+        schema = cell_table(*cells[0]).schema
+
+        def batches():
+            for scenario, strategy_name in cells:
+                yield from cell_table(scenario, strategy_name).to_batches()
+
+        ds.write_dataset(
+            batches(),
+            folder,
+            schema=schema,
+            format="parquet",
+            partitioning=PARTITION_COLUMNS,
+            partitioning_flavor="hive",
+            file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+            min_rows_per_group=row_group_size,
+            max_rows_per_group=row_group_size,
+            existing_data_behavior="delete_matching"
+        )
+
+
+class CellResultDataset:
+    # lazy reader for a dataset written by CellResultStore.to_parquet;
+    # nothing is loaded until a cell / column subset is asked for
+
+    def __init__(self, folder):
+        import pyarrow.dataset as ds
+
+        self.folder = folder
+        self.dataset = ds.dataset(folder, format="parquet", partitioning="hive")
+
+    @property
+    def columns(self):
+        return self.dataset.schema.names
+
+    def cells(self):
+        import pyarrow.dataset as ds
+
+        cells = set()
+        for fragment in self.dataset.get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            cells.add((keys["scenario"], keys["strategy_name"]))
+        return sorted(cells)
+
+    def _cell_filter(self, scenario=None, strategy_name=None):
+        import pyarrow.dataset as ds
+
+        expr = None
+        for col, value in zip(PARTITION_COLUMNS, (scenario, strategy_name)):
+            if value is not None:
+                cond = ds.field(col) == value
+                expr = cond if expr is None else expr & cond
+        return expr
+
+    def read_cell(self, scenario, strategy_name, columns=None):
+        # only the cell's own files are opened, memory-mapped
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(
+            self.folder,
+            columns=columns,
+            filters=self._cell_filter(scenario, strategy_name),
+            partitioning="hive",
+            memory_map=True
+        )
+        return table.to_pandas()
+
+    def read(self, columns=None, scenario=None, strategy_name=None):
+        # column subsets and cell filters are pushed down to the files
+        return self.dataset.to_table(
+            columns=columns,
+            filter=self._cell_filter(scenario, strategy_name)
+        ).to_pandas()
+
+    def iter_batches(self, columns=None, scenario=None, strategy_name=None, batch_size=250_000):
+        for batch in self.dataset.to_batches(
+            columns=columns,
+            filter=self._cell_filter(scenario, strategy_name),
+            batch_size=batch_size
+        ):
+            yield batch.to_pandas()
+
+    def to_csv(self, filename, columns=None):
+        # optional export, streamed a batch at a time
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        header = True
+        for frame in self.iter_batches(columns=columns):
+            frame.to_csv(filename, mode="w" if header else "a", header=header, index=False)
+            header = False
@@ -2,40 +2,48 @@ import pandas as pd
 import numpy as np
 
 from pricing_engine.experiments.scenarios import SCENARIOS
+from pricing_engine.experiments.grid import run_grid
+from pricing_engine.experiments.results_store import CellResultStore
+from pricing_engine.experiments.replication import replicate_cell, confidence_table
 
 from pricing_engine.data.generator import generate_policy_data
-from pricing_engine.risk.simulate_claims import simulate_claims
+from pricing_engine.risk.simulate_claims import simulate_claims, draw_claims
+from pricing_engine.risk.true_risk import true_risk_score
 from pricing_engine.risk.frequency import fit_frequency_model, prepare_features
 from pricing_engine.risk.severity import fit_severity_model
 from pricing_engine.risk.burn_cost import calculate_burn_cost
-from pricing_engine.pricing.simulate_demand import simulate_demand
+from pricing_engine.pricing.simulate_demand import draw_demand, demand_utility
 from pricing_engine.pricing.demand import fit_demand_model
-from pricing_engine.pricing.optimisation import optimise_price
-from pricing_engine.constraints.underwriting_rules import apply_underwriting_rules
-from pricing_engine.constraints.caps_collars import apply_caps_and_collars
-from pricing_engine.constraints.discounts import apply_discounts
+from pricing_engine.pricing.repricing import pricing_graph
 
-from pricing_engine.monitoring.ave import calculate_ave
+from pricing_engine.monitoring.ave import calculate_ave, EXPERIMENT_AVE_COLUMNS
 from pricing_engine.monitoring.control_charts import flag_out_of_control
 from pricing_engine.monitoring.drift import detect_drift
 
 from pricing_engine.evaluation.experiment_reporting import summarize_experiments
-from pricing_engine.evaluation.experiment_reporting import save_policy_records
+from pricing_engine.evaluation.experiment_reporting import save_policy_records, save_experiment_results
 
-from pricing_engine.config.base import CONFIG as BASE_CONFIG
-from pricing_engine.config.aggressive import CONFIG as AGGRESSIVE_CONFIG
-from pricing_engine.config.conservative import CONFIG as CONSERVATIVE_CONFIG
+from pricing_engine.config.strategies import STRATEGIES
 
+from pricing_engine.model_cache import add_cache_arguments, configure_from_args
+from pricing_engine.risk.backends import add_backend_argument, configure_backend
+from pricing_engine.stage_graph import add_stage_cache_arguments, configure_stage_cache_from_args
+from pricing_engine.profiling import (
+    profiled, profile_stage, add_profile_arguments, configure_profiling_from_args, is_enabled, write_trace
+)
+
+import argparse
 import os
+from functools import partial
+
+PRICING_STRATEGIES = STRATEGIES
 
-PRICING_STRATEGIES = {
-    "base": BASE_CONFIG,
-    "aggressive": AGGRESSIVE_CONFIG,
-    "conservative": CONSERVATIVE_CONFIG
-}
+# base price -> optimisation -> rules; burn cost comes from the policy records
+SCENARIO_GRAPH = pricing_graph(with_burn_cost=False)
 
 
-def generate_policy_records():
+@profiled
+def generate_policy_records(seed=0):
 
     print("Policy Data...")
     df = generate_policy_data(n=50_000)
@@ -52,142 +60,203 @@ def generate_policy_records():
 
     df["base_price"] = df["expected_burn_cost"]
 
-    market_noise = np.random.normal(loc=1.0, scale=0.05, size=len(df))
+    market_noise = np.random.default_rng(seed).normal(loc=1.0, scale=0.05, size=len(df))
     df["market_price"] = df["base_price"] * 1.2 * market_noise
 
     df = df.rename(columns={"incurred": "py_incurred"})
     return df
 
-def run_scenario(df, name, params, strategy_name, config):
-
-    scenario_suffix = f"{name}_{strategy_name}"
-
-    df = simulate_claims(df, 2)
-    df["incurred"] *= params["claims_inflation"]
-
-    base_price = df["base_price"] * (1 + config["profit_margin"])
+def _child_seed(seed):
+    if seed is None:
+        return np.random.SeedSequence()
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(1)[0]
+
+def run_scenario(df, name, params, strategy_name, config, seed=None, replications=0):
+    # df is treated as read-only; the cell's outputs come back as arrays.
+    # with replications > 0 a table of Monte Carlo intervals per summary
+    # metric is returned as well (else None)
+
+    risk = true_risk_score(df)
+    _, incurred = draw_claims(risk, np.random.default_rng(seed=2))
+    incurred *= params["claims_inflation"]
+
+    context = {
+        "price_grid": np.array([0.9, 1.0, 1.1, 1.2]),
+        "expense_change": params["expense_change"],
+        "declined_price": None,
+    }
+    base_price = SCENARIO_GRAPH.run(df, config, context, targets=["base_price"])["base_price"]
 
-    df = simulate_demand(
+    market_price = (
+        df["market_price"]
+        * config["demand_shock_factor"]
+        * params["demand_shock"]
+    )
+    rel_price, renewal_likelihood, actual_renewal = draw_demand(
         df,
         premium=base_price,
-        market_price=df["market_price"]
-            * config["demand_shock_factor"]
-            * params["demand_shock"]
+        market_price=market_price,
+        seed=seed
     )
 
-    df[f"renewal_likelihood_{scenario_suffix}"] = df["renewal_likelihood"]
-    df[f"actual_renewal_{scenario_suffix}"] = df["accepted"]
-
-    demand_model, demand_features = fit_demand_model(df)
-
-    price_grid = np.array([0.9, 1.0, 1.1, 1.2])
-    variable_expenses = 25 * config["expense_multiplier"] * params["expense_change"]
-
-    target_price, policy_ltv = optimise_price(
-        base_price=base_price,
-        price_grid=price_grid,
-        demand_model=demand_model,
-        demand_features=demand_features,
-        burn_cost=df["expected_burn_cost"],
-        expenses=variable_expenses
+    demand_df = df[["age", "tenure", "plan"]].assign(
+        rel_price=rel_price,
+        accepted=actual_renewal
     )
-
-    df[f"optimised_loading_{scenario_suffix}"] = (
-        target_price / base_price - 1
-    )
-
-    df["quotable"] = apply_underwriting_rules(df)
-
-    previous_price = base_price * 0.95
-    final_price = apply_caps_and_collars(
-        target_price,
-        previous_price,
-        cap=config["max_cap"],
-        collar=config["min_collar"]
-    )
-    final_price = apply_discounts(df, final_price)
-
-    df[f"final_price_{scenario_suffix}"] = final_price
-    df[f"incurred_{scenario_suffix}"] = df["incurred"]
-
-    accepted_mask = df[f"actual_renewal_{scenario_suffix}"] == 1
-
-    expected_accept = df[f"renewal_likelihood_{scenario_suffix}"].mean()
-    expected_premium = (df[f"renewal_likelihood_{scenario_suffix}"] * df[f"final_price_{scenario_suffix}"]).sum()
-    expected_claims = (df[f"renewal_likelihood_{scenario_suffix}"] * df[f"incurred_{scenario_suffix}"]).sum()
-    expected_contribution = expected_premium - expected_claims
-
-    actual_premium = df.loc[accepted_mask, f"final_price_{scenario_suffix}"].sum()
-    actual_claims = df.loc[accepted_mask, f"incurred_{scenario_suffix}"].sum()
-    actual_contribution = actual_premium - actual_claims
+    demand_model, demand_features = fit_demand_model(demand_df)
+    context["demand_model"] = demand_model
+    context["demand_cols"] = list(demand_features.columns)
+
+    # optimisation and rules; cached row-blocks are reused when only
+    # unrelated config keys changed
+    priced = SCENARIO_GRAPH.run(df, config, context)
+    target_price = priced["optimised_price"]
+    final_price = priced["final_price"]
+
+    optimised_loading = target_price / base_price - 1
+
+    renewal_likelihood = np.asarray(renewal_likelihood, dtype=np.float64)
+
+    columns = {
+        "renewal_likelihood": renewal_likelihood,
+        "actual_renewal": actual_renewal.astype(np.int8),
+        "optimised_loading": optimised_loading,
+        "final_price": final_price,
+        "incurred": incurred,
+    }
 
     summary = {
         "scenario": name,
         "strategy_name": strategy_name,
-
-
-        "GWP_expected": expected_premium,
-        "GWP_actual": actual_premium,
-
-        "Claims_expected": expected_claims,
-        "Claims_actual": actual_claims,
-
-        "Renewal_expected": expected_accept,
-        "Renewal_actual": df[f"actual_renewal_{scenario_suffix}"].mean(),
-
-        "Contribution_expected": expected_contribution,
-        "Contribution_actual": actual_contribution,
-
-        "AvgPremium_expected": expected_premium / len(df),
-        "AvgPremium_actual": actual_premium / len(df),
-
-        "AvgContribution_expected": expected_contribution / len(df),
-        "AvgContribution_actual": actual_contribution / len(df),
-
-        "LossRatio_expected": expected_claims / expected_premium,
-        "LossRatio_actual": actual_claims / actual_premium,
+        **calculate_ave(columns, columns=EXPERIMENT_AVE_COLUMNS)
     }
 
-    summary["AVE_GWP"] = actual_premium / expected_premium
-    summary["AVE_Claims"] = actual_claims / expected_claims
-    summary["AVE_Renewal"] = summary["Renewal_actual"] / summary["Renewal_expected"]
-    summary["AVE_Contribution"] = actual_contribution / expected_contribution
-    summary["AVE_LossRatio"] = summary["LossRatio_actual"] / summary["LossRatio_expected"]
-
-    return df, summary
-
-def main():
+    intervals = None
+    if replications:
+        # prices fixed, claims and renewals redrawn; the replication stream
+        # is a child of the cell seed, independent of the draws above
+        _, utility = demand_utility(df, base_price, market_price)
+        stats, sketches, names = replicate_cell(
+            risk,
+            params["claims_inflation"],
+            utility,
+            final_price,
+            replications,
+            seed=_child_seed(seed)
+        )
+        intervals = confidence_table(stats, sketches, names)
+        intervals.insert(0, "strategy_name", strategy_name)
+        intervals.insert(0, "scenario", name)
+
+    return columns, summary, intervals
+
+def build_grid():
+    return [
+        (name, params, strategy_name, config)
+        for name, params in SCENARIOS.items()
+        for strategy_name, config in PRICING_STRATEGIES.items()
+    ]
+
+def run_cell(df, cell, seed, replications=0):
+    name, params, strategy_name, config = cell
+
+    print(f"Running scenario: {name} | strategy: {strategy_name}")
+
+    # stages called inside the cell nest under it in the profile
+    with profile_stage(f"cell {name}|{strategy_name}", rows=len(df)):
+        return run_scenario(
+            df, name, params, strategy_name, config, seed=seed, replications=replications
+        )
+
+def main(workers=None, seed=0, csv=False, plots=True, replications=0):
+
+    policy_records = generate_policy_records(seed=seed)
+
+    grid = build_grid()
+    with profile_stage("grid", cells=len(grid)):
+        cell_results = run_grid(
+            policy_records,
+            grid,
+            partial(run_cell, replications=replications),
+            workers=workers,
+            seed=seed
+        )
 
     results = []
-
-    policy_records = generate_policy_records()
-
-    for name, params in SCENARIOS.items():
-        for strategy_name, config in PRICING_STRATEGIES.items():
-
-            print(f"Running scenario: {name} | strategy: {strategy_name}")
-
-            policy_records, result = run_scenario(
-                policy_records,
-                name,
-                params,
-                strategy_name,
-                config
-            )
-
-            results.append(result)
+    intervals = []
+    store = CellResultStore(len(policy_records))
+    for (name, _, strategy_name, _), (columns, result, cell_intervals) in zip(grid, cell_results):
+        store.add(name, strategy_name, columns)
+        results.append(result)
+        if cell_intervals is not None:
+            intervals.append(cell_intervals)
 
     save_policy_records(
         policy_records,
-        filename=os.path.join("data", "policy_records.csv")
+        filename=os.path.join("data", "policy_base.parquet")
+    )
+    save_policy_records(
+        store,
+        filename=os.path.join("data", "policy_records")
     )
+    if csv:
+        save_policy_records(policy_records, filename=os.path.join("data", "policy_base.csv"))
+        save_policy_records(store, filename=os.path.join("data", "policy_records.csv"))
 
     results_df = pd.DataFrame(results)
     #print("\n Scenario - Strategy Results")
     #print(results_df)
 
-    summarize_experiments(results_df, output_folder="experiment_reports")
+    if intervals:
+        save_experiment_results(
+            pd.concat(intervals, ignore_index=True),
+            filename=os.path.join("experiment_reports", "replication_results.parquet")
+        )
+        if csv:
+            save_experiment_results(
+                pd.concat(intervals, ignore_index=True),
+                filename=os.path.join("experiment_reports", "replication_results.csv")
+            )
+
+    summarize_experiments(
+        results_df,
+        output_folder="experiment_reports",
+        csv=csv,
+        plots=plots,
+        workers=workers
+    )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scenario x strategy experiments")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="grid cells run in parallel (default: all cores, 1 = serial)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="root seed; each cell gets its own child stream")
+    parser.add_argument("--csv", action="store_true",
+                        help="also export policy records, results and pivots as CSV")
+    parser.add_argument("--replications", type=int, default=0,
+                        help="Monte Carlo replications per cell for confidence intervals (0 = off)")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="skip the heatmaps (results and pivots are still written)")
+    add_cache_arguments(parser)
+    add_backend_argument(parser)
+    add_stage_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_backend(args.model_backend)
+    configure_stage_cache_from_args(args)
+    configure_profiling_from_args(args)
+    main(
+        workers=args.workers,
+        seed=args.seed,
+        csv=args.csv,
+        plots=not args.no_plots,
+        replications=args.replications
+    )
+    if is_enabled():
+        write_trace()
@@ -1,3 +1,5 @@
+import argparse
+
 import numpy as np
 import pandas as pd
 
@@ -5,26 +7,27 @@ from pricing_engine.data.generator import generate_policy_data
 from pricing_engine.risk.simulate_claims import simulate_claims
 from pricing_engine.risk.frequency import fit_frequency_model, prepare_features
 from pricing_engine.risk.severity import fit_severity_model
-from pricing_engine.risk.burn_cost import calculate_burn_cost
 from pricing_engine.risk.burn_cost_glm import fit_burn_cost_glm
 
 from pricing_engine.pricing.simulate_demand import simulate_demand
 from pricing_engine.pricing.demand import fit_demand_model
-from pricing_engine.pricing.optimisation import optimise_price
-
-from pricing_engine.constraints.caps_collars import apply_caps_and_collars
-from pricing_engine.constraints.discounts import apply_discounts
-from pricing_engine.constraints.underwriting_rules import apply_underwriting_rules
+from pricing_engine.pricing.repricing import pricing_graph
 
-from pricing_engine.monitoring.control_charts import flag_out_of_control
+from pricing_engine.monitoring.ave import calculate_ave
+from pricing_engine.monitoring.control_charts import ControlChartMonitor
 from pricing_engine.evaluation.metrics import calculate_loss_ratio
 from pricing_engine.evaluation.reporting import generate_overall_report
 
 from pricing_engine.config.base import CONFIG
+from pricing_engine.artifacts import save_bundle
+from pricing_engine.model_cache import add_cache_arguments, configure_from_args
+from pricing_engine.risk.backends import add_backend_argument, configure_backend, model_backend
+from pricing_engine.stage_graph import add_stage_cache_arguments, configure_stage_cache_from_args
+from pricing_engine.profiling import add_profile_arguments, configure_profiling_from_args, is_enabled, write_trace
 
 
 
-def main():
+def main(seed=0, bundle_dir=None):
 
     print("Generating policy data...")
     df = generate_policy_data(n=100_000)
@@ -42,11 +45,17 @@ def main():
     sev_model = fit_severity_model(df, X)
 
     print("Calculating burn cost...")
-    df["expected_burn_cost"] = calculate_burn_cost(
-        freq_model,
-        sev_model,
-        X
-    )
+    graph = pricing_graph()
+    context = {
+        "freq_model": freq_model,
+        "sev_model": sev_model,
+        "feature_cols": list(feature_cols),
+        "price_grid": np.linspace(0.8, 1.4, 15),
+        "expense_change": 1.0,
+        "declined_price": np.nan,
+    }
+    priced = graph.run(df, CONFIG, context, targets=["base_price"])
+    df["expected_burn_cost"] = priced["expected_burn_cost"]
 
     print("Fitting GLM burn cost model...")
     burn_cost_glm = fit_burn_cost_glm(
@@ -55,8 +64,9 @@ def main():
     )
 
     print("Creating base and market prices (policy level)...")
-    df["base_price"] = df["expected_burn_cost"] * (1 + CONFIG["profit_margin"])
-    df["market_price"] = df["base_price"] * 1.2 * np.random.normal(1.0, 0.05, size=len(df))
+    df["base_price"] = priced["base_price"]
+    market_noise = np.random.default_rng(seed).normal(1.0, 0.05, size=len(df))
+    df["market_price"] = df["base_price"] * 1.2 * market_noise
 
     print("Simulating demand...")
     df = simulate_demand(
@@ -70,70 +80,53 @@ def main():
 
     print("Fitting demand model...")
     demand_model, demand_features = fit_demand_model(df)
+    context["demand_model"] = demand_model
+    context["demand_cols"] = list(demand_features.columns)
+
+    if bundle_dir:
+        path = save_bundle(
+            {**context, "burn_cost_glm": burn_cost_glm},
+            CONFIG,
+            folder=bundle_dir,
+            price_grid=context["price_grid"],
+            backend=model_backend()
+        )
+        print(f"Saved model bundle to {path}")
 
     print("Optimising price (policy-level)...")
-    price_grid = np.linspace(0.8, 1.4, 15)
+    print("Applying underwriting rules, caps & collars and discounts...")
     expenses = 25 * CONFIG["expense_multiplier"]
 
-    target_price, target_ltv = optimise_price(
-        base_price=df["base_price"],
-        price_grid=price_grid,
-        demand_model=demand_model,
-        demand_features=demand_features,
-        burn_cost=df["expected_burn_cost"],
-        expenses=expenses
-    )
-
-    df["optimised_price"] = target_price
-    df["optimised_loading"] = (target_price / df["base_price"]) - 1
-
-    print("Applying underwriting rules...")
-    df["quotable"] = apply_underwriting_rules(df)
-
-    print("Applying caps & collars...")
-    previous_price = df["base_price"] * 0.95
-
-    df["capped_price"] = np.where(
-        df["quotable"],
-        apply_caps_and_collars(
-            price=df["optimised_price"],
-            previous_price=previous_price,
-            cap=CONFIG["max_cap"],
-            collar=CONFIG["min_collar"]
-        ),
-        np.nan
-    )
-
-    print("Applying discounts...")
-    df["final_price"] = np.where(
-        df["quotable"],
-        apply_discounts(df, df["capped_price"]),
-        np.nan
-    )
-
-    accepted_mask = df["actual_renewal"] == 1
+    # only blocks / stages whose inputs or config keys changed are recomputed
+    priced = graph.run(df, CONFIG, context)
+    print(f"Stage cache: {graph.report()}")
 
-    # expected
-    expected_premium = (df["renewal_likelihood"] * df["final_price"]).sum()
-    expected_claims = (df["renewal_likelihood"] * df["incurred"]).sum()
+    target_ltv = priced["ltv"]
+    df["optimised_price"] = priced["optimised_price"]
+    df["optimised_loading"] = (df["optimised_price"] / df["base_price"]) - 1
+    df["quotable"] = priced["quotable"]
+    df["final_price"] = priced["final_price"]
 
-    # actual
-    actual_premium = df.loc[accepted_mask, "final_price"].sum()
-    actual_claims = df.loc[accepted_mask, "incurred"].sum()
+    ave = calculate_ave(df)
 
     print("\n--- Expected vs Actual ---")
-    print(f"Expected GWP: {expected_premium:,.0f}")
-    print(f"Actual GWP: {actual_premium:,.0f}")
+    print(f"Expected GWP: {ave['GWP_expected']:,.0f}")
+    print(f"Actual GWP: {ave['GWP_actual']:,.0f}")
 
-    print(f"Expected Claims: {expected_claims:,.0f}")
-    print(f"Actual Claims: {actual_claims:,.0f}")
+    print(f"Expected Claims: {ave['Claims_expected']:,.0f}")
+    print(f"Actual Claims: {ave['Claims_actual']:,.0f}")
 
     print("\n--- AVE ---")
-    print(f"AVE GWP: {actual_premium / expected_premium:.2f}")
-    print(f"AVE Claims: {actual_claims / expected_claims:.2f}")
+    print(f"AVE GWP: {ave['AVE_GWP']:.2f}")
+    print(f"AVE Claims: {ave['AVE_Claims']:.2f}")
+    print(calculate_ave(df, segment_cols="plan")[["AVE_GWP", "AVE_Claims", "AVE_Renewal"]].round(2))
 
-    out_of_control = flag_out_of_control(df["incurred"])
-    print("\nOut of control policies:", out_of_control.sum())
+    # claims control charts by plan; row order stands in for inception
+    # month, so the book plays back as two years of monthly experience
+    charts = ControlChartMonitor("plan")
+    for month in np.array_split(np.arange(len(df)), 24):
+        chart = charts.update(df[["plan", "incurred"]].iloc[month])
+    print("\nOut of control plans:", chart.index[chart["out_of_control"]].tolist())
 
     df = calculate_loss_ratio(df)
 
@@ -162,4 +155,20 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="End-to-end pricing run")
+    add_cache_arguments(parser)
+    add_backend_argument(parser)
+    add_stage_cache_arguments(parser)
+    add_profile_arguments(parser)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the market price noise")
+    parser.add_argument("--save-bundle", metavar="DIR", default=None,
+                        help="save the fitted models as a versioned bundle in DIR (see score.py)")
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_backend(args.model_backend)
+    configure_stage_cache_from_args(args)
+    configure_profiling_from_args(args)
+    main(seed=args.seed, bundle_dir=args.save_bundle)
+    if is_enabled():
+        write_trace()
\ No newline at end of file
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# on-disk cache of fitted models, keyed by a hash of the training data,
+# feature columns and hyperparameters. Entries are evicted least recently
+# used first once the folder grows past max_bytes, down to EVICT_TO of it
+# so a full folder is not rescanned on every put. The folder size is kept
+# as a running estimate, so a put does not list and stat every entry; the
+# folder is only rescanned when the estimate goes over max_bytes, or every
+# RESCAN_PUTS puts to pick up what other processes wrote.
+#
+# settings live in environment variables so process-pool workers inherit them:
+#   PRICING_ENGINE_MODEL_CACHE      "0" disables the cache
+#   PRICING_ENGINE_MODEL_CACHE_DIR  cache folder
+
+ENABLED_ENV = "PRICING_ENGINE_MODEL_CACHE"
+DIR_ENV = "PRICING_ENGINE_MODEL_CACHE_DIR"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pricing_engine", "models")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+RESCAN_PUTS = 256
+EVICT_TO = 0.9
+
+
+def hash_values(h, values):
+    if isinstance(values, (pd.DataFrame, pd.Series)):
+        frame = values.to_frame() if isinstance(values, pd.Series) else values
+        h.update(repr([(str(c), str(t)) for c, t in frame.dtypes.items()]).encode())
+        for col in frame.columns:
+            _hash_array(h, frame[col])
+    else:
+        _hash_array(h, values)
+
+
+def _hash_array(h, values):
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+        # codes plus the category order, without hashing every label
+        h.update(repr(list(values.cat.categories)).encode())
+        values = values.cat.codes.to_numpy()
+    elif isinstance(values, pd.Series) and not pd.api.types.is_numeric_dtype(values.dtype):
+        values = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    values = np.ascontiguousarray(values)
+    if values.dtype == object:
+        values = pd.util.hash_array(values.ravel())
+    h.update(str(values.dtype).encode())
+    h.update(str(values.shape).encode())
+    h.update(values.view(np.uint8).ravel() if values.size else b"")
+
+
+def model_key(model, X, y, fit_params=None):
+    import sklearn
+
+    h = hashlib.sha256()
+    h.update(type(model).__module__.encode())
+    h.update(type(model).__qualname__.encode())
+    h.update(sklearn.__version__.encode())
+    h.update(repr(sorted(model.get_params(deep=True).items())).encode())
+    hash_values(h, X)
+    hash_values(h, y)
+    # fit params (e.g. sample_weight) change the fitted model as much as X does
+    for name, value in sorted((fit_params or {}).items()):
+        h.update(name.encode())
+        if value is None or isinstance(value, (bool, int, float, str)):
+            h.update(repr(value).encode())
+        else:
+            hash_values(h, value)
+    return h.hexdigest()
+
+
+class ModelCache:
+    # subclasses can point at their own folder / environment variables
+    enabled_env = ENABLED_ENV
+    dir_env = DIR_ENV
+    default_dir = DEFAULT_CACHE_DIR
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, enabled=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # running size estimate per folder, set by the first scan
+        self._sizes = {}
+        self._puts = 0
+
+    def _dir(self):
+        return self.directory or os.environ.get(self.dir_env, self.default_dir)
+
+    def is_enabled(self):
+        if self.enabled is not None:
+            return self.enabled
+        return os.environ.get(self.enabled_env, "1") != "0"
+
+    def _path(self, key):
+        return os.path.join(self._dir(), f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # touch for LRU ordering
+        os.utime(path)
+        return model
+
+    def put(self, key, model):
+        folder = self._dir()
+        os.makedirs(folder, exist_ok=True)
+
+        # write then rename so concurrent workers never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, self._path(key))
+
+        self._puts += 1
+        if folder not in self._sizes or self._puts % RESCAN_PUTS == 0:
+            self.evict()
+        else:
+            # an overwritten key is counted twice; that only rescans early
+            self._sizes[folder] += size
+            if self._sizes[folder] > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        folder = self._dir()
+        if not os.path.isdir(folder):
+            return []
+
+        entries = []
+        for name in os.listdir(folder):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, name in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(os.path.join(self._dir(), name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._sizes[self._dir()] = total
+
+    def clear(self):
+        for _, _, name in self.entries():
+            try:
+                os.remove(os.path.join(self._dir(), name))
+            except FileNotFoundError:
+                pass
+        self._sizes[self._dir()] = 0
+
+    def fit(self, model, X, y, **fit_params):
+        if not self.is_enabled():
+            return model.fit(X, y, **fit_params)
+
+        key = model_key(model, X, y, fit_params)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        model.fit(X, y, **fit_params)
+        self.put(key, model)
+        return model
+
+
+default_cache = ModelCache()
+
+
+def configure(enabled=None, directory=None, clear=False):
+    # also exported to the environment so worker processes pick it up
+    if enabled is not None:
+        os.environ[ENABLED_ENV] = "1" if enabled else "0"
+    if directory is not None:
+        os.environ[DIR_ENV] = directory
+    if clear:
+        default_cache.clear()
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--no-model-cache", action="store_true",
+                        help="always refit models, ignoring the on-disk cache")
+    parser.add_argument("--clear-model-cache", action="store_true",
+                        help="delete all cached models before running")
+    parser.add_argument("--model-cache-dir", default=None,
+                        help=f"cache folder (default {DEFAULT_CACHE_DIR})")
+
+
+def configure_from_args(args):
+    configure(
+        enabled=not args.no_model_cache,
+        directory=args.model_cache_dir,
+        clear=args.clear_model_cache
+    )
+
+
+def fit_cached(model, X, y, **fit_params):
+    # fit model on (X, y), or return an identical previously fitted model
+    return default_cache.fit(model, X, y, **fit_params)
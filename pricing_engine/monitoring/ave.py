@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+from pricing_engine.evaluation.metrics import segment_groups
+from pricing_engine.profiling import profiled
+
+# actual vs expected (AvE) monitoring over a stream of experience.
+#
+# every AvE metric is a ratio of additive totals, so a monitor only keeps
+# seven running sums per segment and batches of any size (a month of
+# renewals, a late claims bordereau, a chunk of a large book) are folded in
+# as they arrive. Memory is constant per segment, and monitors built on
+# different chunks or workers can be merged.
+#
+# totals per segment:
+#   n             policies, or exposure when an exposure column is given
+#   p_sum / n_acc expected / actual renewals
+#   ep / ap       expected / actual premium
+#   ec / ac       expected / actual claims
+
+TOTALS = ["n", "p_sum", "ep", "ec", "n_acc", "ap", "ac"]
+
+# role -> column name; every role but exposure must be present in a batch
+# (claims may arrive later through add_claims), a missing one is a KeyError
+#   expected_claims  the model's expected claims per policy. The experiments
+#                    map it to the simulated claims themselves ("incurred"),
+#                    which needs the claims in the same batch
+#   exposure         None counts each row as one policy; otherwise renewals,
+#                    premium and expected claims are weighted by it (earned
+#                    exposure, in years), actual claims are amounts and are not
+AVE_COLUMNS = {
+    "expected_renewal": "renewal_likelihood",
+    "actual_renewal": "actual_renewal",
+    "price": "final_price",
+    "claims": "incurred",
+    "expected_claims": "expected_burn_cost",
+    "exposure": None,
+}
+
+# the experiment grid's cells carry no model expectation
+EXPERIMENT_AVE_COLUMNS = {"expected_claims": "incurred"}
+
+
+def summary_metrics(n, p_sum, ep, ec, n_acc, ap, ac):
+    # cell metrics from totals; scalars for one run, arrays for replications
+    expected_accept = p_sum / n
+    actual_accept = n_acc / n
+    expected_contribution = ep - ec
+    actual_contribution = ap - ac
+
+    metrics = {
+        "GWP_expected": ep,
+        "GWP_actual": ap,
+
+        "Claims_expected": ec,
+        "Claims_actual": ac,
+
+        "Renewal_expected": expected_accept,
+        "Renewal_actual": actual_accept,
+
+        "Contribution_expected": expected_contribution,
+        "Contribution_actual": actual_contribution,
+
+        "AvgPremium_expected": ep / n,
+        "AvgPremium_actual": ap / n,
+
+        "AvgContribution_expected": expected_contribution / n,
+        "AvgContribution_actual": actual_contribution / n,
+
+        "LossRatio_expected": ec / ep,
+        "LossRatio_actual": ac / ap,
+    }
+
+    metrics["AVE_GWP"] = ap / ep
+    metrics["AVE_Claims"] = ac / ec
+    metrics["AVE_Renewal"] = metrics["Renewal_actual"] / metrics["Renewal_expected"]
+    metrics["AVE_Contribution"] = actual_contribution / expected_contribution
+    metrics["AVE_LossRatio"] = metrics["LossRatio_actual"] / metrics["LossRatio_expected"]
+    return metrics
+
+
+def _values(data, col, n, optional=False):
+    # NaNs (e.g. declined prices) are skipped; a configured column that is
+    # missing is an error rather than silently reported as 0
+    if col not in data:
+        if optional:
+            return np.zeros(n)
+        raise KeyError(f"AvE column {col!r} is not in the batch")
+    values = np.asarray(data[col], dtype=np.float64)
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def _n_rows(data):
+    return len(data) if isinstance(data, pd.DataFrame) else len(next(iter(data.values())))
+
+
+class AveMonitor:
+
+    def __init__(self, segment_cols=(), columns=None):
+        self.segment_cols = [segment_cols] if isinstance(segment_cols, str) else list(segment_cols)
+        self.columns = {**AVE_COLUMNS, **(columns or {})}
+        # segment key (tuple of labels, () when unsegmented) -> totals
+        self.totals = {}
+
+    def _add(self, data, rows):
+        # rows: (n, len(TOTALS)) per-row contributions
+        if not self.segment_cols:
+            self._fold([()], rows.sum(axis=0, keepdims=True))
+            return
+
+        keys, inverse = segment_groups(data, self.segment_cols)
+        sums = np.column_stack([
+            np.bincount(inverse, weights=rows[:, j], minlength=len(keys))
+            for j in range(rows.shape[1])
+        ])
+        self._fold(keys, sums)
+
+    def _fold(self, keys, sums):
+        for key, row in zip(keys, sums):
+            if key in self.totals:
+                self.totals[key] += row
+            else:
+                self.totals[key] = row.copy()
+
+    def update(self, data):
+        # a batch of policy experience: a DataFrame or dict of arrays holding
+        # the AVE_COLUMNS roles and the segment columns. The claims column may
+        # be absent when claims are reported later through add_claims
+        cols = self.columns
+        n = _n_rows(data)
+
+        w = _values(data, cols["exposure"], n) if cols["exposure"] else np.ones(n)
+        p = _values(data, cols["expected_renewal"], n) * w
+        accepted = _values(data, cols["actual_renewal"], n) * w
+        price = _values(data, cols["price"], n)
+        claims = _values(data, cols["claims"], n, optional=True)
+        expected_claims = _values(data, cols["expected_claims"], n)
+
+        rows = np.column_stack([
+            w,
+            p,
+            p * price,
+            p * expected_claims,
+            accepted,
+            accepted * price,
+            (accepted > 0) * claims,
+        ])
+        self._add(data, rows)
+        return self
+
+    def add_claims(self, data):
+        # claims reported on renewed policies after their policy batch was
+        # seen (e.g. a monthly claims feed): only actual claims move
+        if self.columns["expected_claims"] == self.columns["claims"]:
+            raise ValueError(
+                "expected claims are read from the claims column, so claims cannot arrive "
+                "later; map expected_claims to a model expectation such as expected_burn_cost"
+            )
+        n = _n_rows(data)
+        rows = np.zeros((n, len(TOTALS)))
+        rows[:, TOTALS.index("ac")] = _values(data, self.columns["claims"], n)
+        self._add(data, rows)
+        return self
+
+    def merge(self, other):
+        self._fold(list(other.totals), list(other.totals.values()))
+        return self
+
+    def overall(self):
+        # AVE metrics over all segments
+        total = np.sum(list(self.totals.values()), axis=0) if self.totals else np.zeros(len(TOTALS))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return summary_metrics(*total)
+
+    def report(self):
+        # one row per segment: totals-derived metrics, indexed by segment
+        keys = sorted(self.totals, key=lambda k: tuple((v is None, str(v)) for v in k))
+        totals = np.array([self.totals[k] for k in keys]).reshape(-1, len(TOTALS))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            metrics = summary_metrics(*totals.T)
+
+        if not self.segment_cols:
+            index = pd.RangeIndex(len(keys))
+        elif len(self.segment_cols) == 1:
+            index = pd.Index([k[0] for k in keys], name=self.segment_cols[0])
+        else:
+            index = pd.MultiIndex.from_tuples(keys, names=self.segment_cols)
+
+        exposure = "exposure" if self.columns["exposure"] else "policies"
+        return pd.DataFrame({exposure: totals[:, 0], **metrics}, index=index)
+
+
+@profiled
+def calculate_ave(data, segment_cols=None, columns=None):
+    # AvE on finished experience: a metrics dict, or a per-segment table
+    # when segment_cols is given
+    monitor = AveMonitor(segment_cols or (), columns).update(data)
+    return monitor.report() if segment_cols else monitor.overall()
@@ -1,10 +1,175 @@
+import numpy as np
 import pandas as pd
-from scipy.stats import ks_2samp
+
+# feature drift against a binned reference sketch.
+#
+# the reference is reduced once to per-feature bin counts: quantile bins
+# for numeric features (one bin per value when there are few distinct
+# values), a frequency table for categoricals, plus a last bin per feature
+# for missing / unseen values. Any frame can then be sketched on the same
+# layout in one pass, sketches of chunks or time windows add up with
+# merge(), and all features are scored together on the flat count vectors:
+#   psi   population stability index
+#   ks    largest gap between the binned CDFs (numerics only; a lower bound
+#         of the raw-data KS statistic), asymptotic p-value
+#   chi2  chi-square goodness of fit of the current counts to the
+#         reference proportions
+# so a drift check costs O(bins), whatever the size of the reference.
+
+N_BINS = 20
+LAYOUT_SAMPLE = 1_000_000
+PSI_FLOOR = 1e-4
+
+
+def _is_categorical(series):
+    return not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)
+
+
+def _feature_layout(series, n_bins):
+    if _is_categorical(series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            levels = series.cat.categories
+        else:
+            levels = pd.Index(series.dropna().unique()).sort_values()
+        return ("categorical", pd.Index(levels))
+
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[~np.isnan(values)]
+    uniques = np.unique(values)
+    if len(uniques) <= n_bins:
+        # one bin per value: bin i holds [u_i, u_i+1)
+        edges = uniques[1:]
+    else:
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+    return ("numeric", edges)
+
+
+def _bin_codes(series, kind, spec):
+    # bin index per row; the feature's last bin takes missing / unseen values
+    if kind == "numeric":
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        codes = np.searchsorted(spec, values, side="right")
+        codes[np.isnan(values)] = len(spec) + 1
+        return codes
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.set_categories(spec).cat.codes.to_numpy()
+    else:
+        codes = pd.Categorical(series, categories=spec).codes
+    return np.where(codes < 0, len(spec), codes)
+
+
+def _n_bins(kind, spec):
+    # numeric: len(edges) + 1 intervals; categorical: levels; plus missing
+    return len(spec) + 2 if kind == "numeric" else len(spec) + 1
+
+
+class DriftSketch:
+
+    def __init__(self, layout):
+        # layout: {feature: (kind, edges or levels)}
+        self.layout = layout
+        self.features = list(layout)
+        sizes = [_n_bins(*layout[f]) for f in self.features]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.feature_ids = np.repeat(np.arange(len(sizes)), sizes)
+        self.counts = np.zeros(int(np.sum(sizes)), dtype=np.int64)
+
+    @classmethod
+    def reference(cls, df, features, n_bins=N_BINS, sample=LAYOUT_SAMPLE, seed=0):
+        # layout from (a sample of) df, then counts over all of df; further
+        # reference chunks can be added with update()
+        layout_rows = df
+        if sample and len(df) > sample:
+            rows = np.random.default_rng(seed).choice(len(df), sample, replace=False)
+            layout_rows = df.iloc[np.sort(rows)]
+        layout = {f: _feature_layout(layout_rows[f], n_bins) for f in features}
+        return cls(layout).update(df)
+
+    def empty(self):
+        # a sketch with the same layout and no counts
+        return DriftSketch(self.layout)
+
+    def sketch(self, df):
+        return self.empty().update(df)
+
+    def update(self, df):
+        for f, offset in zip(self.features, self.offsets):
+            kind, spec = self.layout[f]
+            self.counts[offset:offset + _n_bins(kind, spec)] += np.bincount(
+                _bin_codes(df[f], kind, spec), minlength=_n_bins(kind, spec)
+            )
+        return self
+
+    def merge(self, other):
+        if other.features != self.features:
+            raise ValueError("Sketches have different layouts")
+        self.counts += other.counts
+        return self
+
+    def score(self, current):
+        # one row per feature, self as the reference; current is a sketch on
+        # the same layout or a frame to sketch
+        from scipy.stats import chi2, kstwobign
+
+        if not isinstance(current, DriftSketch):
+            current = self.sketch(current)
+
+        fid = self.feature_ids
+        n_features = len(self.features)
+        ref = self.counts.astype(np.float64)
+        cur = current.counts.astype(np.float64)
+        n_ref = np.bincount(fid, weights=ref, minlength=n_features)
+        n_cur = np.bincount(fid, weights=cur, minlength=n_features)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_ref = ref / n_ref[fid]
+            p_cur = cur / n_cur[fid]
+
+            a = np.maximum(p_cur, PSI_FLOOR)
+            e = np.maximum(p_ref, PSI_FLOOR)
+            psi = np.bincount(fid, weights=(a - e) * np.log(a / e), minlength=n_features)
+
+            # within-feature CDFs from one global cumsum
+            gap = np.cumsum(p_cur - p_ref)
+            sizes = np.diff(np.append(self.offsets, len(gap)))
+            gap -= np.repeat(np.concatenate([[0.0], gap[self.offsets[1:] - 1]]), sizes)
+            ks = np.maximum.reduceat(np.abs(gap), self.offsets)
+            numeric = np.array([self.layout[f][0] == "numeric" for f in self.features])
+            ks = np.where(numeric, ks, np.nan)
+            ks_pvalue = kstwobign.sf(ks * np.sqrt(n_ref * n_cur / (n_ref + n_cur)))
+
+            expected = n_cur[fid] * p_ref
+            used = expected > 0
+            chi_stat = np.bincount(
+                fid, weights=np.where(used, (cur - expected) ** 2 / np.where(used, expected, 1.0), 0.0),
+                minlength=n_features
+            )
+            dof = np.bincount(fid, weights=used, minlength=n_features) - 1
+            chi_pvalue = chi2.sf(chi_stat, np.maximum(dof, 1))
+
+        last = np.append(self.offsets[1:], len(cur)) - 1
+
+        return pd.DataFrame({
+            "kind": [self.layout[f][0] for f in self.features],
+            "n_reference": n_ref.astype(np.int64),
+            "n_current": n_cur.astype(np.int64),
+            "n_missing_or_unseen": cur[last].astype(np.int64),
+            "psi": psi,
+            "ks": ks,
+            "ks_pvalue": ks_pvalue,
+            "chi2": chi_stat,
+            "chi2_pvalue": chi_pvalue,
+        }, index=pd.Index(self.features, name="feature"))
+
 
 def detect_drift(current_df, reference_df, feature_cols):
+    # {feature: p-value}: binned KS for numerics, chi-square for categoricals.
+    # reference_df may be a DriftSketch built once with DriftSketch.reference
+    reference = reference_df
+    if not isinstance(reference, DriftSketch):
+        reference = DriftSketch.reference(reference_df, feature_cols)
 
-    drift_results = {}
-    for col in feature_cols:
-        stat, p_value = ks_2samp(reference_df[col], current_df[col])
-        drift_results[col] = p_value
-    return drift_results
\ No newline at end of file
+    scores = reference.score(current_df).loc[feature_cols]
+    p_values = np.where(scores["kind"] == "numeric", scores["ks_pvalue"], scores["chi2_pvalue"])
+    return dict(zip(feature_cols, p_values))
@@ -1,6 +1,9 @@
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LogisticRegression
+
+from pricing_engine.data.schema import dummy_column
+from pricing_engine.model_cache import fit_cached
+from pricing_engine.profiling import profiled
 
 FEATURES = [
     "rel_price",    
@@ -14,7 +17,23 @@ def prepare_demand_features(df):
     X = pd.get_dummies(X, columns=["plan"], drop_first=True) #numeric (one-hot)
     return X
 
+def demand_feature_matrix(df, demand_cols):
+    # prepare_demand_features(df).reindex(columns=demand_cols, fill_value=0)
+    # straight from category codes, as a frame the optimiser can index
+    X = np.zeros((len(df), len(demand_cols)))
+    for j, col in enumerate(demand_cols):
+        if col in df.columns:
+            X[:, j] = df[col].to_numpy()
+        else:
+            dummy = dummy_column(df, col)
+            if dummy is not None:
+                X[:, j] = dummy
+    return pd.DataFrame(X, columns=demand_cols, index=df.index)
+
+@profiled
 def fit_demand_model(df):
+    from sklearn.linear_model import LogisticRegression
+
     X = prepare_demand_features(df)
     y = df["accepted"]  # simulated or historical
 
@@ -23,7 +42,7 @@ def fit_demand_model(df):
         max_iter=500,
         solver="lbfgs"
     )
-    model.fit(X, y)
+    model = fit_cached(model, X, y)
     return model, X
 
 def predict_demand(model, X):
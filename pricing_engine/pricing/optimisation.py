@@ -1,34 +1,107 @@
 import numpy as np
+from scipy.special import expit
+
+from pricing_engine.profiling import profiled
 
 #  doesnt include past renewal data
 
+def split_demand_logit(demand_model, demand_features, price_col="rel_price"):
+    # the logistic demand model is linear in rel_price, so the logit splits into
+    # a per-policy part (computed once) plus price_coef * rel_price
+    cols = list(demand_features.columns)
+    j = cols.index(price_col)
+
+    coef = np.asarray(demand_model.coef_, dtype=np.float64).ravel()
+    other_cols = cols[:j] + cols[j + 1:]
+    other_coef = np.delete(coef, j)
+
+    X_other = demand_features[other_cols].to_numpy(dtype=np.float64)
+    base_logit = X_other @ other_coef + demand_model.intercept_[0]
+
+    return base_logit, coef[j]
+
+
+def _newton_price(rel, base, margin_cost, base_logit, price_coef, lower, upper,
+                  max_iter=25, tol=1e-10):
+    # solves d/dr [sigmoid(a + b r) * (base r - c)] = 0 per policy, starting
+    # from the best grid point; f' = sigmoid * g so we drive g to zero
+    for _ in range(max_iter):
+        p = expit(base_logit + price_coef * rel)
+        margin = base * rel - margin_cost
+        g = price_coef * (1 - p) * margin + base
+        dg = price_coef * (1 - p) * (base - price_coef * p * margin)
+
+        step = np.divide(g, dg, out=np.zeros_like(g), where=dg != 0)
+        rel = np.clip(rel - step, lower, upper)
+
+        if np.max(np.abs(step), initial=0.0) < tol:
+            break
+
+    return rel
+
+
+@profiled
 def optimise_price(
     base_price,
     price_grid,
     demand_model,
     demand_features,
     burn_cost,
-    expenses
+    expenses,
+    method="grid",
+    chunk_size=100_000
 ):
+    # method="grid" picks the best multiplier on price_grid (first wins on ties)
+    # method="newton" refines that to the continuous optimum within the grid range
+    base_price = np.asarray(base_price, dtype=np.float64)
+    burn_cost = np.asarray(burn_cost, dtype=np.float64)
+    expenses = np.broadcast_to(np.asarray(expenses, dtype=np.float64), base_price.shape)
+    price_grid = np.asarray(price_grid, dtype=np.float64)
+
+    if method not in ("grid", "newton"):
+        raise ValueError(f"Unknown optimisation method: {method}")
+
+    base_logit, price_coef = split_demand_logit(demand_model, demand_features)
+
     n_policies = len(base_price)
-    n_grid = len(price_grid)
 
     best_price = np.zeros(n_policies)
     best_ltv = np.full(n_policies, -np.inf)
 
-    for m in price_grid:
-        price = base_price * m
+    for start in range(0, n_policies, chunk_size):
+        rows = slice(start, start + chunk_size)
+        base = base_price[rows, None]
+        margin_cost = (burn_cost[rows] + expenses[rows])[:, None]
 
-        X = demand_features.copy()
-        X["rel_price"] = price / base_price
+        # (policies x grid) in one broadcast
+        price = base * price_grid
+        p_accept = expit(base_logit[rows, None] + price_coef * (price / base))
+        profit_per_quote = p_accept * (price - margin_cost)
+        profit_per_quote[np.isnan(profit_per_quote)] = -np.inf
 
-        p_accept = demand_model.predict_proba(X)[:, 1]
+        best = np.argmax(profit_per_quote, axis=1)
+        ltv = np.take_along_axis(profit_per_quote, best[:, None], axis=1)[:, 0]
+        found = ltv > -np.inf
 
-        profit_per_quote = p_accept * (price - burn_cost - expenses)
+        best_ltv[rows] = ltv
+        best_price[rows] = np.where(found, price[np.arange(len(best)), best], 0.0)
 
-        improve_mask = profit_per_quote > best_ltv
+        if method == "newton" and price_coef < 0:
+            rel = _newton_price(
+                price_grid[best],
+                base[:, 0],
+                margin_cost[:, 0],
+                base_logit[rows],
+                price_coef,
+                price_grid.min(),
+                price_grid.max()
+            )
+            price_c = base[:, 0] * rel
+            ltv_c = expit(base_logit[rows] + price_coef * rel) * (price_c - margin_cost[:, 0])
 
-        best_ltv[improve_mask] = profit_per_quote[improve_mask]
-        best_price[improve_mask] = price[improve_mask]
+            # keep the grid answer wherever Newton did not improve on it
+            better = found & (ltv_c > ltv)
+            best_price[rows] = np.where(better, price_c, best_price[rows])
+            best_ltv[rows] = np.where(better, ltv_c, ltv)
 
     return best_price, best_ltv
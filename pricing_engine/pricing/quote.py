@@ -0,0 +1,81 @@
+import numpy as np
+
+from pricing_engine.data.schema import to_policy_frame
+from pricing_engine.risk.backends import model_backend
+from pricing_engine.risk.frequency import prepare_features, feature_matrix
+from pricing_engine.risk.burn_cost import calculate_burn_cost
+from pricing_engine.pricing.demand import demand_feature_matrix
+from pricing_engine.pricing.optimisation import optimise_price
+from pricing_engine.constraints.rules import compile_rules
+from pricing_engine.profiling import profiled
+
+# the pricing chain for already-fitted models, with no simulation or
+# training: burn cost -> base price -> optimised price -> underwriting,
+# caps & collars and discounts, each one vectorised call over the batch.
+# models: {"freq_model", "sev_model", "feature_cols", "demand_model",
+# "demand_cols"} plus an optional "backend" (see risk/backends.py)
+
+DEFAULT_PRICE_GRID = np.linspace(0.8, 1.4, 15)
+
+
+@profiled
+def price_quotes(
+    df,
+    models,
+    config,
+    price_grid=DEFAULT_PRICE_GRID,
+    expenses=None,
+    previous_price=None,
+    declined_price=np.nan,
+    rules=None
+):
+    # returns {output: array}; a missing (None / NaN) previous price defaults
+    # to base price * 0.95 as in the batch runs; rules can be compiled once
+    # and passed in
+    if expenses is None:
+        expenses = 25 * config["expense_multiplier"]
+    if rules is None:
+        rules = compile_rules(config)
+
+    # categorical dtypes keep every level, so one-hot columns line up with
+    # the fitted ones even when a batch holds a single plan or bmi band
+    df = to_policy_frame(df)
+
+    if model_backend(models.get("backend")) == "gbm":
+        X = feature_matrix(df, models["feature_cols"])
+    else:
+        X = prepare_features(df, models.get("backend")).reindex(columns=models["feature_cols"], fill_value=0)
+    burn_cost = calculate_burn_cost(models["freq_model"], models["sev_model"], X)
+    base_price = burn_cost * (1 + config["profit_margin"])
+
+    # rel_price is overridden by every grid point, so its value here is irrelevant
+    demand_features = demand_feature_matrix(df.assign(rel_price=1.0), models["demand_cols"])
+    target_price, ltv = optimise_price(
+        base_price=base_price,
+        price_grid=price_grid,
+        demand_model=models["demand_model"],
+        demand_features=demand_features,
+        burn_cost=burn_cost,
+        expenses=expenses
+    )
+
+    if previous_price is None:
+        previous_price = base_price * 0.95
+    else:
+        previous_price = np.asarray(previous_price, dtype=np.float64)
+        previous_price = np.where(np.isnan(previous_price), base_price * 0.95, previous_price)
+    quotable, final_price = rules.apply(
+        df,
+        price=target_price,
+        previous_price=previous_price,
+        declined_price=declined_price
+    )
+
+    return {
+        "expected_burn_cost": burn_cost,
+        "base_price": base_price,
+        "optimised_price": target_price,
+        "ltv": ltv,
+        "quotable": quotable,
+        "final_price": final_price,
+    }
@@ -0,0 +1,107 @@
+from pricing_engine.risk.frequency import prepare_features, FEATURES as RISK_FEATURES
+from pricing_engine.risk.burn_cost import calculate_burn_cost
+from pricing_engine.pricing.demand import prepare_demand_features
+from pricing_engine.pricing.optimisation import optimise_price
+from pricing_engine.constraints.rules import UNDERWRITING_RULES, DISCOUNT_RULES, compile_rules
+from pricing_engine.stage_graph import Stage, StageGraph
+
+# the pricing chain as a stage graph (see stage_graph.py):
+#   burn_cost -> base_price -> optimise -> rules (underwriting, caps & collars, discounts)
+# each stage declares the config keys and context objects it reads, so e.g.
+# a max_cap change only reruns the rules stage
+
+
+def burn_cost_stage(frame, config, context):
+    # a block can miss a category, so align dummies to the fitted columns
+    X = prepare_features(frame).reindex(columns=context["feature_cols"], fill_value=0)
+    return {
+        "expected_burn_cost": calculate_burn_cost(context["freq_model"], context["sev_model"], X)
+    }
+
+
+def base_price_stage(frame, config, context):
+    return {
+        "base_price": frame["expected_burn_cost"].to_numpy() * (1 + config["profit_margin"])
+    }
+
+
+def optimise_stage(frame, config, context):
+    # rel_price is overridden by every grid point, so its value here is irrelevant
+    demand_features = prepare_demand_features(frame.assign(rel_price=1.0)).reindex(
+        columns=context["demand_cols"], fill_value=0
+    )
+    expenses = 25 * config["expense_multiplier"] * context["expense_change"]
+
+    target_price, ltv = optimise_price(
+        base_price=frame["base_price"],
+        price_grid=context["price_grid"],
+        demand_model=context["demand_model"],
+        demand_features=demand_features,
+        burn_cost=frame["expected_burn_cost"],
+        expenses=expenses
+    )
+    return {"optimised_price": target_price, "ltv": ltv}
+
+
+def rules_stage(frame, config, context):
+    previous_price = frame["base_price"].to_numpy() * 0.95
+
+    rules = compile_rules(config, context["decline_rules"], context["discount_rules"])
+    quotable, final_price = rules.apply(
+        frame,
+        price=frame["optimised_price"],
+        previous_price=previous_price,
+        declined_price=context["declined_price"]
+    )
+    return {"quotable": quotable, "final_price": final_price}
+
+
+def _rule_columns():
+    columns = {c[0] for group in UNDERWRITING_RULES for c in group}
+    columns |= {rule["when"][0] for rule in DISCOUNT_RULES if "when" in rule}
+    columns |= {rule["rate"][0] for rule in DISCOUNT_RULES if "rate" in rule}
+    return sorted(columns)
+
+
+BURN_COST_STAGE = Stage(
+    "burn_cost",
+    burn_cost_stage,
+    outputs=["expected_burn_cost"],
+    columns=RISK_FEATURES,
+    context_keys=["freq_model", "sev_model", "feature_cols"]
+)
+
+PRICING_STAGES = [
+    Stage(
+        "base_price",
+        base_price_stage,
+        outputs=["base_price"],
+        columns=["expected_burn_cost"],
+        config_keys=["profit_margin"]
+    ),
+    Stage(
+        "optimise",
+        optimise_stage,
+        outputs=["optimised_price", "ltv"],
+        columns=["age", "tenure", "plan", "base_price", "expected_burn_cost"],
+        config_keys=["expense_multiplier"],
+        context_keys=["demand_model", "demand_cols", "price_grid", "expense_change"]
+    ),
+    Stage(
+        "rules",
+        rules_stage,
+        outputs=["quotable", "final_price"],
+        columns=_rule_columns() + ["optimised_price", "base_price"],
+        config_keys=["max_cap", "min_collar", "max_discount"],
+        context_keys=["declined_price"],
+        # the rule definitions are part of the cache key, so editing a rule
+        # reruns the stage
+        constants={"decline_rules": UNDERWRITING_RULES, "discount_rules": DISCOUNT_RULES}
+    ),
+]
+
+
+def pricing_graph(with_burn_cost=True, **kwargs):
+    # without the burn cost stage, expected_burn_cost is read from the input frame
+    stages = [BURN_COST_STAGE] + PRICING_STAGES if with_burn_cost else PRICING_STAGES
+    return StageGraph(stages, **kwargs)
@@ -1,21 +1,43 @@
 import numpy as np
 
+from pricing_engine.data.schema import is_level
+from pricing_engine.profiling import profiled
+
 rng = np.random.default_rng(seed=100)
 
-def simulate_demand(df, premium, market_price):
+# sd of the per-policy noise on the latent renewal utility
+DEMAND_NOISE_SD = 0.7
+
+def demand_utility(df, premium, market_price):
+    # deterministic part of the latent renewal utility
     rel_price = premium / market_price
 
-    latent_utility = (
+    utility = (
     0.3                                
     - 5.0 * (rel_price - 1.0)           
     + 0.04 * df["tenure"]             
     + 0.15 * (df["age"] > 50)         
-    + np.where(df["plan"] == "Premium", 0.5, 0.0)
-    + rng.normal(0, 0.7, size=len(df)) 
+    + np.where(is_level(df["plan"], "plan", "Premium"), 0.5, 0.0)
 )
 
+    return rel_price, utility
+
+@profiled
+def draw_demand(df, premium, market_price, seed=None):
+    # seed gives the caller its own stream; otherwise the shared module rng is used
+    gen = rng if seed is None else np.random.default_rng(seed)
+
+    rel_price, utility = demand_utility(df, premium, market_price)
+    latent_utility = utility + gen.normal(0, DEMAND_NOISE_SD, size=len(df))
+
     prob_accept = 1 / (1 + np.exp(-latent_utility))
-    accepted = rng.binomial(1, prob_accept)
+    accepted = gen.binomial(1, prob_accept)
+
+    return rel_price, prob_accept, accepted
+
+@profiled
+def simulate_demand(df, premium, market_price, seed=None):
+    rel_price, prob_accept, accepted = draw_demand(df, premium, market_price, seed)
 
     df = df.copy()
     df["rel_price"] = rel_price
@@ -25,4 +47,4 @@ def simulate_demand(df, premium, market_price):
     df["renewal_likelihood"] = prob_accept
     df["actual_renewal"] = accepted
 
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,335 @@
+import cProfile
+import functools
+import json
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# stage-level profiling. Stage functions are wrapped with @profiled (or a
+# block with `with profile_stage(name, rows=n)`); when profiling is on each
+# call records
+#   wall and CPU time, rows processed and rows/s
+#   the rise in peak RSS, and with memory tracing the tracemalloc peak
+#   above the allocation at entry
+#   its path of enclosing stages (e.g. "grid/cell stress|base/stage:optimise")
+# Events are appended per process to <output>.events/<pid>.jsonl, so grid
+# workers report too, and write_trace() merges them into a Chrome trace
+# (chrome://tracing, https://ui.perfetto.dev) with a per-stage summary.
+# An optional hook runs cProfile or pyinstrument (sampling) on the
+# outermost stage and saves its report next to the events.
+#
+# when off a wrapped call costs one flag check. Settings live in
+# environment variables so process-pool workers inherit them:
+#   PRICING_ENGINE_PROFILE         trace output file; unset = off
+#   PRICING_ENGINE_PROFILE_HOOK    "cprofile" or "pyinstrument"
+#   PRICING_ENGINE_PROFILE_MEMORY  "1" traces allocations (slow)
+
+PROFILE_ENV = "PRICING_ENGINE_PROFILE"
+HOOK_ENV = "PRICING_ENGINE_PROFILE_HOOK"
+MEMORY_ENV = "PRICING_ENGINE_PROFILE_MEMORY"
+
+HOOKS = ["cprofile", "pyinstrument"]
+
+MB = 1024 ** 2
+# ru_maxrss is in kilobytes on Linux, bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class _State:
+
+    def __init__(self):
+        self.load()
+
+    def load(self):
+        self.output = os.environ.get(PROFILE_ENV) or None
+        self.enabled = self.output is not None
+        self.hook = os.environ.get(HOOK_ENV) or None
+        self.memory = os.environ.get(MEMORY_ENV) == "1"
+        self.stack = []
+        self.inherited = 0
+        self.pid = None
+        self.file = None
+        self.n_hooked = 0
+
+
+_state = _State()
+
+
+def events_dir(output=None):
+    return (output or _state.output) + ".events"
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT if resource else 0
+
+
+def _count_rows(args, kwargs, result):
+    # first argument (or else result) with a shape: frame, array, matrix
+    if isinstance(result, tuple):
+        result = result[0] if result else None
+    for value in (*args, *kwargs.values(), result):
+        shape = getattr(value, "shape", None)
+        if shape:
+            return int(shape[0])
+    return None
+
+
+def _check_process():
+    if _state.pid != os.getpid():
+        # first stage in this process, or a forked worker: its own events
+        # file, and the stages open in the parent at fork time only give
+        # the path prefix
+        _state.pid = os.getpid()
+        _state.inherited = len(_state.stack)
+        os.makedirs(events_dir(), exist_ok=True)
+        _state.file = open(os.path.join(events_dir(), f"{_state.pid}.jsonl"), "a", buffering=1)
+
+
+class _Span:
+
+    def __init__(self, name, rows=None, args=None):
+        self.name = name
+        self.rows = rows
+        self.args = args or {}
+        self.child_peak = 0
+        self.profiler = None
+
+    def __enter__(self):
+        _check_process()
+        parent = _state.stack[-1] if _state.stack else None
+        self.path = f"{parent.path}/{self.name}" if parent else self.name
+
+        if _state.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, peak)
+            tracemalloc.reset_peak()
+            self.traced_start = current
+
+        if _state.hook and not any(s.profiler for s in _state.stack[_state.inherited:]):
+            self.profiler = _start_hook(_state.hook)
+
+        _state.stack.append(self)
+        self.rss_start = _peak_rss()
+        self.ts = time.time_ns() // 1000
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        rss = _peak_rss()
+        _state.stack.pop()
+
+        args = {
+            "path": self.path,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "peak_rss_mb": rss / MB,
+            "rss_growth_mb": (rss - self.rss_start) / MB,
+            **self.args,
+        }
+        if self.rows is not None:
+            args["rows"] = self.rows
+            args["rows_per_s"] = self.rows / wall if wall > 0 else None
+        if _state.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            args["traced_peak_mb"] = (peak - self.traced_start) / MB
+            args["traced_delta_mb"] = (current - self.traced_start) / MB
+            if _state.stack:
+                _state.stack[-1].child_peak = max(_state.stack[-1].child_peak, peak)
+        if self.profiler is not None:
+            args["profile"] = _stop_hook(_state.hook, self.profiler, self.name)
+
+        _state.file.write(json.dumps({
+            "name": self.name,
+            "cat": "stage",
+            "ph": "X",
+            "ts": self.ts,
+            "dur": int(wall * 1e6),
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": args,
+        }) + "\n")
+        return False
+
+
+class _NullSpan:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def profile_stage(name, rows=None, **args):
+    # context manager; rows can also be set on the span inside the block
+    return _Span(name, rows, args) if _state.enabled else _NULL_SPAN
+
+
+def profiled(func=None, name=None, rows=_count_rows):
+    # @profiled or @profiled(name=..., rows=func(args, kwargs, result) -> int)
+    if func is None:
+        return functools.partial(profiled, name=name, rows=rows)
+    stage_name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled:
+            return func(*args, **kwargs)
+        with _Span(stage_name) as span:
+            result = func(*args, **kwargs)
+            span.rows = rows(args, kwargs, result) if rows else None
+        return result
+
+    return wrapper
+
+
+def is_enabled():
+    return _state.enabled
+
+
+# profiler hooks --------------------------------------------------------------
+
+def _start_hook(hook):
+    if hook == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError as err:
+        raise ImportError("the sampling profiler hook needs pyinstrument: pip install pyinstrument") from err
+    profiler = Profiler()
+    profiler.start()
+    return profiler
+
+
+def _stop_hook(hook, profiler, name):
+    _state.n_hooked += 1
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    stem = os.path.join(events_dir(), f"{safe_name}-{os.getpid()}-{_state.n_hooked}")
+    if hook == "cprofile":
+        profiler.disable()
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = stem + ".txt"
+        with open(path, "w") as f:
+            f.write(profiler.output_text())
+    return path
+
+
+# configuration and output ----------------------------------------------------
+
+def configure_profiling(output=None, hook=None, memory=False):
+    # output=None turns profiling off; events from an earlier run are cleared
+    if output is None:
+        os.environ.pop(PROFILE_ENV, None)
+    else:
+        if hook not in (None, *HOOKS):
+            raise ValueError(f"Unknown profiler hook: {hook}")
+        os.environ[PROFILE_ENV] = output
+        os.environ[HOOK_ENV] = hook or ""
+        os.environ[MEMORY_ENV] = "1" if memory else "0"
+        shutil.rmtree(events_dir(output), ignore_errors=True)
+    _state.load()
+
+
+def read_events(output=None):
+    folder = events_dir(output)
+    events = []
+    if os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".jsonl"):
+                with open(os.path.join(folder, name)) as f:
+                    events.extend(json.loads(line) for line in f if line.strip())
+    return sorted(events, key=lambda e: e["ts"])
+
+
+def stage_summary(events):
+    # per stage name: calls, wall / CPU seconds, rows and rows/s, peak memory
+    summary = {}
+    for event in events:
+        args = event["args"]
+        s = summary.setdefault(event["name"], {
+            "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0,
+            "peak_rss_mb": 0.0, "traced_peak_mb": None,
+        })
+        s["calls"] += 1
+        s["wall_s"] += args["wall_s"]
+        s["cpu_s"] += args["cpu_s"]
+        s["rows"] += args.get("rows") or 0
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], args["peak_rss_mb"])
+        if "traced_peak_mb" in args:
+            s["traced_peak_mb"] = max(s["traced_peak_mb"] or 0.0, args["traced_peak_mb"])
+    for s in summary.values():
+        s["rows_per_s"] = s["rows"] / s["wall_s"] if s["rows"] and s["wall_s"] > 0 else None
+    return dict(sorted(summary.items(), key=lambda item: -item[1]["wall_s"]))
+
+
+def format_summary(summary):
+    lines = [f"{'stage':<40} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rows/s':>12} {'peak RSS MB':>12} {'traced MB':>10}"]
+    for name, s in summary.items():
+        rows_per_s = f"{s['rows_per_s']:,.0f}" if s["rows_per_s"] else "-"
+        traced = f"{s['traced_peak_mb']:.1f}" if s["traced_peak_mb"] is not None else "-"
+        lines.append(
+            f"{name[:40]:<40} {s['calls']:>6} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f}"
+            f" {rows_per_s:>12} {s['peak_rss_mb']:>12.0f} {traced:>10}"
+        )
+    return "\n".join(lines)
+
+
+def write_trace(output=None):
+    # merge every process's events into one Chrome trace file; returns the summary
+    output = output or _state.output
+    events = read_events(output)
+    summary = stage_summary(events)
+
+    pids = sorted({e["pid"] for e in events})
+    metadata = [
+        {"name": "process_name", "ph": "M", "pid": pid,
+         "args": {"name": "main" if i == 0 else f"worker {pid}"}}
+        for i, pid in enumerate(pids)
+    ]
+
+    folder = os.path.dirname(output)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms", "stages": summary}, f)
+
+    print(f"\nProfile ({len(events):,} stage calls) written to {output}")
+    print(format_summary(summary))
+    return summary
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", metavar="FILE", default=None,
+                        help="record stage timings / memory to a Chrome trace JSON file")
+    parser.add_argument("--profile-hook", choices=HOOKS, default=None,
+                        help="also profile the outermost stages with cProfile or pyinstrument")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="trace allocations per stage with tracemalloc (slow)")
+
+
+def configure_profiling_from_args(args):
+    configure_profiling(args.profile, hook=args.profile_hook, memory=args.profile_memory)
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.data.schema import CATEGORY_LEVELS, POLICY_DTYPES, NCD_LEVELS, EXCESS_LEVELS
+from pricing_engine.risk.simulate_claims import simulate_claims
+from pricing_engine.pricing.quote import price_quotes, DEFAULT_PRICE_GRID
+from pricing_engine.constraints.rules import compile_rules
+from pricing_engine.streaming_stats import RunningStats, QuantileSketch
+from pricing_engine.streaming import fit_models
+from pricing_engine.artifacts import load_bundle
+
+from pricing_engine.config.base import CONFIG as BASE_CONFIG
+from pricing_engine.config.strategies import STRATEGIES
+
+from pricing_engine.model_cache import add_cache_arguments, configure_from_args
+from pricing_engine.risk.backends import add_backend_argument, configure_backend
+
+# asyncio quote service: models and a strategy config are loaded once, single
+# policy quotes arrive over HTTP and concurrent requests are grouped into
+# micro-batches (up to max_batch quotes, waiting at most max_wait_ms for
+# company) that go through the pricing chain (pricing/quote.py) as one
+# vectorised call on a worker thread, while the event loop keeps accepting.
+#
+#   POST /quote   {"age": 45, "tenure": 3.2, "smoker": "N", "bmi": "Normal",
+#                  "plan": "Standard", "ncd": 20, "excess": 250,
+#                  "previous_price": 410.0 (optional)}
+#   GET  /stats   latency p50 / p99, throughput, batch sizes
+#
+# python -m pricing_engine.quote_service --port 8080 --strategy base
+
+QUOTE_FIELDS = ["age", "tenure", "smoker", "bmi", "plan", "ncd", "excess"]
+
+LEVEL_INDEX = {col: {level: i for i, level in enumerate(levels)} for col, levels in CATEGORY_LEVELS.items()}
+
+MAX_BATCH = 256
+MAX_WAIT_MS = 2.0
+
+
+def validate_quote(policy):
+    # rejected up front, so one bad request cannot fail a whole batch
+    missing = [f for f in QUOTE_FIELDS if f not in policy]
+    if missing:
+        raise ValueError(f"missing fields: {missing}")
+    for col in ["smoker", "bmi", "plan"]:
+        if policy[col] not in CATEGORY_LEVELS[col]:
+            raise ValueError(f"{col} must be one of {CATEGORY_LEVELS[col]}")
+    for col in ["age", "tenure", "ncd", "excess"] + (["previous_price"] if policy.get("previous_price") is not None else []):
+        value = policy[col]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{col} must be a number")
+        # json accepts NaN / Infinity, and the narrow int casts in quotes_frame
+        # would wrap anything outside the schema domain
+        if not np.isfinite(value):
+            raise ValueError(f"{col} must be finite")
+    if not 0 <= policy["age"] <= 100:
+        raise ValueError("age must be between 0 and 100")
+    if policy["tenure"] < 0:
+        raise ValueError("tenure must be >= 0")
+    if policy["ncd"] not in NCD_LEVELS:
+        raise ValueError(f"ncd must be one of {NCD_LEVELS}")
+    if policy["excess"] not in EXCESS_LEVELS:
+        raise ValueError(f"excess must be one of {EXCESS_LEVELS}")
+    if policy.get("previous_price") is not None and policy["previous_price"] < 0:
+        raise ValueError("previous_price must be >= 0")
+
+
+def quotes_frame(policies):
+    # policy frame in the compact schema, built from already validated quotes;
+    # categoricals go straight to codes rather than through string parsing
+    columns = {}
+    for col in QUOTE_FIELDS:
+        values = [p[col] for p in policies]
+        if col in CATEGORY_LEVELS:
+            index = LEVEL_INDEX[col]
+            columns[col] = pd.Categorical.from_codes([index[v] for v in values], dtype=POLICY_DTYPES[col])
+        else:
+            columns[col] = np.array(values, dtype=np.float64).astype(POLICY_DTYPES[col])
+    return pd.DataFrame(columns)
+
+
+class QuoteService:
+
+    def __init__(self, models, config, price_grid=DEFAULT_PRICE_GRID, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.models = models
+        self.config = config
+        self.price_grid = np.asarray(price_grid, dtype=np.float64)
+        self.rules = compile_rules(config)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+
+        # one pricing thread: the next batch fills up while this one prices
+        self._executor = ThreadPoolExecutor(1)
+        self._queue = None
+        self._task = None
+
+        self.latency = QuantileSketch()
+        self.batch_size = RunningStats()
+        self.n_quotes = 0
+        self.started = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batcher())
+
+    async def stop(self):
+        self._task.cancel()
+        self._executor.shutdown()
+
+    async def quote(self, policy):
+        validate_quote(policy)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((policy, future, time.perf_counter()))
+        return await future
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+
+            if self.started is None:
+                self.started = time.perf_counter()
+
+            policies = [item[0] for item in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.price_batch, policies)
+            except Exception as err:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+
+            done = time.perf_counter()
+            for (_, future, arrived), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self.latency.update([(done - arrived) * 1000 for _, _, arrived in batch])
+            self.batch_size.update([len(batch)])
+            self.n_quotes += len(batch)
+
+    def price_batch(self, policies):
+        df = quotes_frame(policies)
+        previous_price = None
+        if any(p.get("previous_price") is not None for p in policies):
+            # NaN where a quote has none
+            previous_price = np.array(
+                [np.nan if p.get("previous_price") is None else p["previous_price"] for p in policies],
+                dtype=np.float64
+            )
+
+        priced = price_quotes(
+            df,
+            self.models,
+            self.config,
+            price_grid=self.price_grid,
+            previous_price=previous_price,
+            rules=self.rules
+        )
+
+        return [
+            {
+                "quotable": bool(priced["quotable"][i]),
+                "final_price": None if np.isnan(priced["final_price"][i]) else round(float(priced["final_price"][i]), 2),
+                "expected_burn_cost": round(float(priced["expected_burn_cost"][i]), 2),
+                "optimised_price": round(float(priced["optimised_price"][i]), 2),
+            }
+            for i in range(len(df))
+        ]
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        p50, p99 = self.latency.quantile([0.5, 0.99]) if self.n_quotes else (np.nan, np.nan)
+        return {
+            "quotes": self.n_quotes,
+            "batches": self.batch_size.count,
+            "mean_batch_size": float(self.batch_size.mean[()]) if self.batch_size.count else 0.0,
+            "latency_p50_ms": float(p50),
+            "latency_p99_ms": float(p99),
+            "throughput_qps": self.n_quotes / elapsed if elapsed else 0.0,
+        }
+
+
+# HTTP/1.1 with keep-alive, just enough for JSON quotes --------------------
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+def _response(status, payload):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"\r\n"
+    )
+    return head.encode() + body
+
+
+async def _handle(service, method, path, body):
+    if method == "POST" and path == "/quote":
+        try:
+            policy = json.loads(body)
+            if not isinstance(policy, dict):
+                raise ValueError("expected a JSON object")
+            return 200, await service.quote(policy)
+        except ValueError as err:
+            return 400, {"error": str(err)}
+    if method == "GET" and path == "/stats":
+        return 200, service.stats()
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok"}
+    return 404, {"error": f"no route for {method} {path}"}
+
+
+def make_connection_handler(service):
+
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await _handle(service, method, path, body)
+                except Exception as err:
+                    status, payload = 500, {"error": repr(err)}
+
+                writer.write(_response(status, payload))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return handle_connection
+
+
+async def start_server(service, host="127.0.0.1", port=8080):
+    await service.start()
+    return await asyncio.start_server(make_connection_handler(service), host, port)
+
+
+def load_models(train_size=50_000, config=BASE_CONFIG, seed=0):
+    # fits on a simulated book (served from the model cache after the first run)
+    print(f"Fitting models on {train_size:,} simulated policies...")
+    df = simulate_claims(generate_policy_data(n=train_size, seed=seed), seed=seed)
+    return fit_models(df, config, seed=seed)
+
+
+async def serve(service, host, port):
+    server = await start_server(service, host, port)
+    print(f"Quote service on http://{host}:{port} (POST /quote, GET /stats)")
+    async with server:
+        await server.serve_forever()
+
+
+def add_service_arguments(parser):
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="base")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                        help="most quotes priced in one vectorised call")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="how long a batch waits for more quotes before pricing")
+    parser.add_argument("--train-size", type=int, default=50_000)
+    parser.add_argument("--bundle", default=None,
+                        help="serve the models of a saved bundle (see artifacts.py) instead of fitting")
+    add_cache_arguments(parser)
+    add_backend_argument(parser)
+
+
+def service_from_args(args):
+    configure_from_args(args)
+    configure_backend(args.model_backend)
+    config = STRATEGIES[args.strategy]
+    if args.bundle:
+        models, manifest = load_bundle(args.bundle)
+        print(f"Loaded model bundle {manifest['bundle_id']} ({manifest['created']})")
+    else:
+        models = load_models(args.train_size, config)
+    return QuoteService(
+        models,
+        config,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching quote service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_service_arguments(parser)
+    args = parser.parse_args()
+
+    asyncio.run(serve(service_from_args(args), args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
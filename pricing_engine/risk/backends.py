@@ -0,0 +1,45 @@
+import os
+
+from pricing_engine.config.models import MODEL_CONFIG
+
+# backend for the frequency / severity models (see config/models.py).
+# the choice is exported to the environment so process-pool workers use
+# the same one:
+#   PRICING_ENGINE_MODEL_BACKEND  "gbm" or "hist"
+
+BACKEND_ENV = "PRICING_ENGINE_MODEL_BACKEND"
+
+# estimator class names in sklearn.ensemble, imported when a model is made
+BACKENDS = {
+    "gbm": "GradientBoostingRegressor",
+    "hist": "HistGradientBoostingRegressor",
+}
+
+
+def model_backend(backend=None):
+    backend = backend or os.environ.get(BACKEND_ENV) or MODEL_CONFIG["backend"]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}")
+    return backend
+
+
+def make_model(target, backend=None, config=MODEL_CONFIG):
+    # target is "frequency" or "severity"
+    import sklearn.ensemble
+
+    backend = model_backend(backend)
+    params = dict(config[backend][target])
+    if backend == "hist":
+        # bmi / plan arrive as pandas categoricals (see prepare_features)
+        params.setdefault("categorical_features", "from_dtype")
+    return getattr(sklearn.ensemble, BACKENDS[backend])(**params)
+
+
+def configure_backend(backend):
+    if backend is not None:
+        os.environ[BACKEND_ENV] = model_backend(backend)
+
+
+def add_backend_argument(parser):
+    parser.add_argument("--model-backend", choices=sorted(BACKENDS), default=None,
+                        help=f"frequency / severity model backend (default {MODEL_CONFIG['backend']})")
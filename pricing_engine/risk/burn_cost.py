@@ -1,7 +1,17 @@
 import numpy as np
 import pandas as pd
 
-def calculate_burn_cost(freq_model, sev_model, X):
-    freq = freq_model.predict(X)
-    sev = sev_model.predict(X)
-    return freq * sev
\ No newline at end of file
+from pricing_engine.risk.tree_inference import predict_product
+from pricing_engine.profiling import profiled
+
+@profiled
+def calculate_burn_cost(freq_model, sev_model, X, backend="auto", chunk_size=200_000, out=None):
+    # freq * sev, scored in one chunked pass (see risk/tree_inference.py)
+    return predict_product(
+        freq_model,
+        sev_model,
+        X,
+        out=out,
+        chunk_size=chunk_size,
+        backend=backend
+    )
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
+
+from pricing_engine.data.schema import is_level
+from pricing_engine.profiling import profiled
 
 GLM_FEATURES = [
     "age",
@@ -10,7 +12,18 @@ GLM_FEATURES = [
     "excess"
 ]
 
+def prepare_glm_features(df):
+    X = df[GLM_FEATURES].copy()
+    X["smoker"] = is_level(X["smoker"], "smoker", "Y").astype(np.int8)
+    X["tenure"] = X["tenure"].clip(0, 50)
+    # as sm.add_constant(X, has_constant="add"), without importing statsmodels
+    X.insert(0, "const", 1.0)
+    X = X.astype(float)
+    return X
+
+@profiled
 def fit_burn_cost_glm(df, burn_cost):
+    import statsmodels.api as sm
 
     burn_cost = burn_cost.copy()
 
@@ -21,14 +34,7 @@ def fit_burn_cost_glm(df, burn_cost):
 
     y = np.log1p(burn_cost) 
 
-    # feature
-    X = df[GLM_FEATURES].copy()
-    X["smoker"] = (X["smoker"] == "Y").astype(int)
-    X["ncd"] = X["ncd"].astype(int)
-    X["excess"] = X["excess"].astype(int)
-    X["tenure"] = X["tenure"].clip(0, 50)
-    X = sm.add_constant(X)
-    X = X.astype(float)
+    X = prepare_glm_features(df)
 
     # fit GLM
     model = sm.GLM(
@@ -38,3 +44,10 @@ def fit_burn_cost_glm(df, burn_cost):
     ).fit()
 
     return model
+
+def predict_burn_cost_glm(model, df):
+    # model is the fitted GLM or its params; Gaussian with identity link, so
+    # predict is X @ params, on the log1p(burn cost) scale
+    params = getattr(model, "params", model)
+    X = prepare_glm_features(df)
+    return np.expm1(X.to_numpy() @ params[X.columns].to_numpy(dtype=np.float64))
@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import GradientBoostingRegressor
+
+from pricing_engine.data.schema import is_level, dummy_column, to_policy_frame
+from pricing_engine.model_cache import fit_cached
+from pricing_engine.risk.backends import model_backend, make_model
+from pricing_engine.profiling import profiled
 
 FEATURES = [
     "age",
@@ -12,26 +16,44 @@ FEATURES = [
     "excess"
 ]
 
-def prepare_features(df):
+@profiled
+def prepare_features(df, backend=None):
+    if model_backend(backend) == "hist":
+        # bmi / plan stay categorical, the histogram model splits on them natively
+        X = to_policy_frame(df[FEATURES])
+        X["smoker"] = is_level(X["smoker"], "smoker", "Y").astype(np.int8)
+        return X
+
     X = df[FEATURES].copy()
-    X["smoker"] = (X["smoker"] == "Y").astype(int)
+    X["smoker"] = is_level(X["smoker"], "smoker", "Y").astype(np.int8)
     X = pd.get_dummies(X, columns=["bmi", "plan"], drop_first=True)
     return X
 
-def fit_frequency_model(df):
-    X = prepare_features(df)
+def feature_matrix(df, feature_cols):
+    # prepare_features(df).reindex(columns=feature_cols, fill_value=0) for the
+    # one-hot (gbm) backend as a plain array, built from category codes
+    # without get_dummies; its fixed cost is what matters on small batches
+    X = np.zeros((len(df), len(feature_cols)))
+    for j, col in enumerate(feature_cols):
+        if col == "smoker":
+            X[:, j] = is_level(df["smoker"], "smoker", "Y")
+        elif col in df.columns:
+            X[:, j] = df[col].to_numpy()
+        else:
+            dummy = dummy_column(df, col)
+            if dummy is not None:
+                X[:, j] = dummy
+    return X
+
+@profiled
+def fit_frequency_model(df, backend=None):
+    X = prepare_features(df, backend)
     y = df["n_claims"]
 
-    # Hyperparameter tunning can be done here
-    model = GradientBoostingRegressor(
-        loss="squared_error",
-        max_depth=3,
-        n_estimators=150,
-        learning_rate=0.05,
-        random_state=42
-    )
+    # Hyperparameter tunning can be done in config/models.py
+    model = make_model("frequency", backend)
 
-    model.fit(X, y)
+    model = fit_cached(model, X, y)
     return model, X.columns
 
 def predict_frequency(model, X):
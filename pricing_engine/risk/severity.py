@@ -1,21 +1,19 @@
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
 
-def fit_severity_model(df, X):
+from pricing_engine.model_cache import fit_cached
+from pricing_engine.risk.backends import make_model
+from pricing_engine.profiling import profiled
+
+@profiled
+def fit_severity_model(df, X, backend=None):
     mask = df["n_claims"] > 0
 
     y = df.loc[mask, "incurred"] / df.loc[mask, "n_claims"]
 
-    # Hyperparameter tunning can be done here
-    model = GradientBoostingRegressor(
-        loss="squared_error",
-        max_depth=3,
-        n_estimators=200,
-        learning_rate=0.05,
-        random_state=42
-    )
+    # Hyperparameter tunning can be done in config/models.py
+    model = make_model("severity", backend)
 
-    model.fit(X.loc[mask], y)
+    model = fit_cached(model, X.loc[mask], y)
     return model
 
 def predict_severity(model, X):
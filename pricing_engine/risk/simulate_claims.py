@@ -1,35 +1,49 @@
 import numpy as np
 from pricing_engine.risk.true_risk import true_risk_score
+from pricing_engine.profiling import profiled
 
 
-def simulate_claims(df, seed=999):
-
-    rng = np.random.default_rng(seed=seed)
+@profiled
+def draw_claims(risk, rng, base_severity=600):
 
-    risk = true_risk_score(df)
+    risk = np.asarray(risk, dtype=np.float64)
 
     # Frequency
     lambda_freq = np.exp(-3.5 + 0.4 * risk)
     n_claims = rng.poisson(lam=lambda_freq)
 
     # Severity
-    base_severity = 600
     severity_mean = base_severity * risk
 
-    incurred = []
-    for n, mean_sev in zip(n_claims, severity_mean):
-        if n == 0:
-            incurred.append(0.0)
-        else:
-            claims = rng.gamma(
-                shape=2.0,
-                scale=mean_sev / 2.0,
-                size=n
-            )
-            incurred.append(claims.sum())
+    # one flat draw for every claim, then summed back per policy.
+    # draws come off the stream in the same order as a per-policy loop
+    incurred = np.zeros(len(risk), dtype=np.float64)
+
+    claimants = np.flatnonzero(n_claims)
+    if len(claimants):
+        counts = n_claims[claimants]
+        claims = rng.gamma(
+            shape=2.0,
+            scale=np.repeat(severity_mean[claimants] / 2.0, counts)
+        )
+        starts = np.zeros(len(counts), dtype=np.int64)
+        np.cumsum(counts[:-1], out=starts[1:])
+        incurred[claimants] = np.add.reduceat(claims, starts)
+
+    return n_claims, incurred
+
+
+@profiled
+def simulate_claims(df, seed=999):
+
+    rng = np.random.default_rng(seed=seed)
+
+    risk = true_risk_score(df)
+
+    n_claims, incurred = draw_claims(risk, rng)
 
     df = df.copy()
     df["n_claims"] = n_claims
     df["incurred"] = incurred
 
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,196 @@
+import importlib.util
+import os
+import weakref
+
+import numpy as np
+
+# fast scoring of GradientBoostingRegressor ensembles: every tree is padded
+# to a perfect binary tree of the ensemble's max depth and stored in
+# contiguous (n_trees, nodes) arrays, so traversal is branch-free index
+# arithmetic. A numba kernel walks the frequency and severity ensembles
+# over blocks of rows in parallel and writes freq * sev straight into a
+# preallocated output. Without numba we fall back to chunked sklearn predict.
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+# padding doubles per level, so very deep trees stay on sklearn
+MAX_FLAT_DEPTH = 10
+
+_flat_cache = weakref.WeakKeyDictionary()
+_kernel = None
+
+
+class FlatEnsemble:
+
+    def __init__(self, feature, threshold, value, init, depth, n_features):
+        self.feature = feature        # (n_trees, 2**depth - 1) int32
+        self.threshold = threshold    # (n_trees, 2**depth - 1) float32
+        self.value = value            # (n_trees, 2**depth) float64, learning rate applied
+        self.init = init
+        self.depth = depth
+        self.n_features = n_features
+
+
+def supports_flat_inference(model):
+    # every GradientBoostingRegressor loss uses an identity link
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    return (
+        isinstance(model, GradientBoostingRegressor)
+        and hasattr(model, "estimators_")
+        and max(e.tree_.max_depth for e in model.estimators_[:, 0]) <= MAX_FLAT_DEPTH
+    )
+
+
+def _pad_tree(tree, depth, scale, feature, threshold, value):
+    # fills one row of the perfect-tree arrays; a leaf above the bottom level
+    # becomes a pass-through node (threshold +inf, always left) over copies of itself
+    n_internal = 2 ** depth - 1
+    stack = [(0, 0, 0)]
+    while stack:
+        node, pos, level = stack.pop()
+        is_leaf = tree.children_left[node] == -1
+
+        if level == depth:
+            value[pos - n_internal] = scale * tree.value[node, 0, 0]
+            continue
+
+        if is_leaf:
+            feature[pos] = 0
+            threshold[pos] = np.inf
+            stack.append((node, 2 * pos + 1, level + 1))
+            stack.append((node, 2 * pos + 2, level + 1))
+        else:
+            feature[pos] = tree.feature[node]
+            threshold[pos] = tree.threshold[node]
+            stack.append((tree.children_left[node], 2 * pos + 1, level + 1))
+            stack.append((tree.children_right[node], 2 * pos + 2, level + 1))
+
+
+def _float32_thresholds(threshold):
+    # sklearn compares float32 features against float64 thresholds; rounding
+    # each threshold down to the nearest float32 gives the same splits while
+    # letting the kernel compare in float32
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def flatten_gbm(model):
+    cached = _flat_cache.get(model)
+    if cached is not None and cached[0] is model.estimators_:
+        return cached[1]
+
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    depth = max(tree.max_depth for tree in trees)
+
+    feature = np.zeros((len(trees), 2 ** depth - 1), dtype=np.int32)
+    threshold = np.zeros((len(trees), 2 ** depth - 1), dtype=np.float64)
+    value = np.zeros((len(trees), 2 ** depth), dtype=np.float64)
+    for t, tree in enumerate(trees):
+        # same scale * value product sklearn adds per stage
+        _pad_tree(tree, depth, model.learning_rate, feature[t], threshold[t], value[t])
+
+    if model.init_ == "zero":
+        init = 0.0
+    else:
+        init = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+
+    flat = FlatEnsemble(feature, _float32_thresholds(threshold), value, init, depth, model.n_features_in_)
+    _flat_cache[model] = (model.estimators_, flat)
+    return flat
+
+
+def _get_kernel():
+    global _kernel
+    if _kernel is not None:
+        return _kernel
+
+    import numba
+
+    # burn cost is scored in the parent before worker pools fork; TBB's
+    # threads do not survive a fork cleanly, workqueue does (see true_risk)
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER = "workqueue"
+
+    @numba.njit(cache=True, nogil=True)
+    def add_ensemble(X, lo, hi, feature, threshold, value, depth, acc):
+        # trees outer, rows inner keeps each tree's nodes in cache
+        n_internal = 2 ** depth - 1
+        for t in range(feature.shape[0]):
+            f = feature[t]
+            th = threshold[t]
+            v = value[t]
+            for i in range(lo, hi):
+                x = X[i]
+                pos = 0
+                for _ in range(depth):
+                    # x <= threshold goes left, as in sklearn (NaN goes right)
+                    pos = 2 * pos + 2 - (x[f[pos]] <= th[pos])
+                acc[i - lo] += v[pos - n_internal]
+
+    @numba.njit(parallel=True, cache=True, nogil=True)
+    def predict_product(X, a_feature, a_threshold, a_value, a_init, a_depth,
+                        b_feature, b_threshold, b_value, b_init, b_depth, out, block):
+        n = X.shape[0]
+        n_blocks = (n + block - 1) // block
+        for k in numba.prange(n_blocks):
+            lo = k * block
+            hi = min(lo + block, n)
+            a = np.full(hi - lo, a_init)
+            b = np.full(hi - lo, b_init)
+            add_ensemble(X, lo, hi, a_feature, a_threshold, a_value, a_depth, a)
+            add_ensemble(X, lo, hi, b_feature, b_threshold, b_value, b_depth, b)
+            for i in range(lo, hi):
+                out[i] = a[i - lo] * b[i - lo]
+
+    _kernel = predict_product
+    return _kernel
+
+
+def _check_columns(model, X):
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and hasattr(X, "columns") and list(X.columns) != list(names):
+        raise ValueError("X columns do not match the features the model was fitted on")
+
+
+def predict_product(freq_model, sev_model, X, out=None, chunk_size=200_000, backend="auto", block_size=1024):
+    # freq_model.predict(X) * sev_model.predict(X), scored chunk by chunk into out
+    n = len(X)
+    if out is None:
+        out = np.empty(n, dtype=np.float64)
+
+    if backend == "auto":
+        flat_ok = supports_flat_inference(freq_model) and supports_flat_inference(sev_model)
+        backend = "numba" if HAS_NUMBA and flat_ok else "sklearn"
+
+    if backend == "sklearn":
+        for start in range(0, n, chunk_size):
+            Xc = X.iloc[start:start + chunk_size] if hasattr(X, "iloc") else X[start:start + chunk_size]
+            out[start:start + len(Xc)] = freq_model.predict(Xc) * sev_model.predict(Xc)
+        return out
+
+    if backend != "numba":
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    _check_columns(freq_model, X)
+    _check_columns(sev_model, X)
+
+    a = flatten_gbm(freq_model)
+    b = flatten_gbm(sev_model)
+    kernel = _get_kernel()
+
+    for start in range(0, n, chunk_size):
+        # trees compare float32 features, like sklearn
+        Xc = X.iloc[start:start + chunk_size] if hasattr(X, "iloc") else X[start:start + chunk_size]
+        Xc = np.ascontiguousarray(np.asarray(Xc, dtype=np.float32))
+        kernel(
+            Xc,
+            a.feature, a.threshold, a.value, a.init, a.depth,
+            b.feature, b.threshold, b.value, b.init, b.depth,
+            out[start:start + len(Xc)],
+            block_size
+        )
+
+    return out
@@ -1,35 +1,99 @@
+import importlib.util
+import os
+
 import numpy as np
 
-def true_risk_score(df):
+from pricing_engine.config.risk import TRUE_RISK_CONFIG
+from pricing_engine.data.schema import CATEGORY_LEVELS, category_codes
+from pricing_engine.profiling import profiled
+
+# table-driven risk kernel: the factor config becomes small lookup tables
+# indexed by category code, and the score is computed in one pass over
+# (age, smoker, bmi, plan, excess) codes into an optional reused buffer
+#   numba   one fused parallel loop, no temporaries
+#   numpy   in-place ops into out, one gather buffer
+# every backend adds the terms in the same order, so the scores are
+# bit-identical whichever one runs.
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+RISK_BACKENDS = ["auto", "numba", "numpy"]
+
+_kernel = None
+
+
+def factor_table(config, col):
+    return np.array([config[col][level] for level in CATEGORY_LEVELS[col]], dtype=np.float64)
+
+
+def risk_tables(config=TRUE_RISK_CONFIG):
+    return {col: factor_table(config, col) for col in ["smoker", "bmi", "plan"]}
+
+
+def _get_kernel():
+    global _kernel
+    if _kernel is not None:
+        return _kernel
+
+    import numba
+
+    # the kernel runs in the parent before the experiment pool forks, and a
+    # forked child of a process that started TBB threads can hang at exit.
+    # workqueue is fork-safe; kernels are launched from one thread per
+    # process. NUMBA_THREADING_LAYER in the environment takes precedence.
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER = "workqueue"
+
+    @numba.njit(parallel=True, cache=True, nogil=True)
+    def risk_kernel(age, smoker, bmi, plan, excess, smoker_f, bmi_f, plan_f,
+                    base, age_slope, excess_slope, lo, hi, out):
+        for i in numba.prange(age.shape[0]):
+            r = (base + age_slope * age[i] + smoker_f[smoker[i]] + bmi_f[bmi[i]]
+                 + excess_slope * excess[i]) * plan_f[plan[i]]
+            out[i] = min(max(r, lo), hi)
+
+    _kernel = risk_kernel
+    return _kernel
+
 
-    age_factor = 0.015 * df["age"]
+def _numpy_kernel(age, smoker, bmi, plan, excess, tables, config, out):
+    buf = np.empty(len(out))
+    np.multiply(config["age_slope"], age, out=out)
+    np.add(config["base"], out, out=out)
+    out += np.take(tables["smoker"], smoker, out=buf)
+    out += np.take(tables["bmi"], bmi, out=buf)
+    out += np.multiply(config["excess_slope"], excess, out=buf)
+    out *= np.take(tables["plan"], plan, out=buf)
+    np.clip(out, *config["clip"], out=out)
 
-    smoker_factor = np.where(df["smoker"] == "Y", 0.6, 0.0)
 
-    bmi_factor = df["bmi"].map({
-        "Underweight": 0.1,
-        "Normal": 0.0,
-        "Overweight": 0.3,
-        "Obese": 0.7
-    }).values
+@profiled
+def true_risk_score(df, out=None, backend="auto", config=TRUE_RISK_CONFIG):
 
-    plan_factor = df["plan"].map({
-        "Budget": 0.8,
-        "Standard": 1.0,
-        "Premium": 1.3
-    }).values
+    n = len(df)
+    if out is None:
+        out = np.empty(n, dtype=np.float64)
 
-    excess_factor = df["excess"].astype(int)
-    excess_factor = -0.0002 * excess_factor  # higher excess → lower utilisation
+    if backend == "auto":
+        backend = "numba" if HAS_NUMBA else "numpy"
 
-    base = 0.8
+    age = df["age"].to_numpy()
+    excess = df["excess"].to_numpy()
+    smoker = category_codes(df["smoker"], "smoker")
+    bmi = category_codes(df["bmi"], "bmi")
+    plan = category_codes(df["plan"], "plan")
+    tables = risk_tables(config)
 
-    risk_score = (
-        base
-        + age_factor
-        + smoker_factor
-        + bmi_factor
-        + excess_factor
-    ) * plan_factor
+    if backend == "numba":
+        lo, hi = config["clip"]
+        _get_kernel()(
+            age, smoker, bmi, plan, excess,
+            tables["smoker"], tables["bmi"], tables["plan"],
+            config["base"], config["age_slope"], config["excess_slope"], lo, hi, out
+        )
+    elif backend == "numpy":
+        _numpy_kernel(age, smoker, bmi, plan, excess, tables, config, out)
+    else:
+        raise ValueError(f"Unknown risk backend: {backend}")
 
-    return np.clip(risk_score, 0.3, 5.0)
\ No newline at end of file
+    return out
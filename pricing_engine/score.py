@@ -0,0 +1,129 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pricing_engine.artifacts import load_bundle, resolve_bundle, DEFAULT_BUNDLE_DIR
+from pricing_engine.pricing.quote import price_quotes, DEFAULT_PRICE_GRID
+from pricing_engine.risk.burn_cost_glm import predict_burn_cost_glm
+from pricing_engine.constraints.rules import compile_rules
+from pricing_engine.streaming import ParquetChunkWriter
+from pricing_engine.config.strategies import STRATEGIES
+
+# scoring-only run: a Parquet policy book is streamed in chunks through the
+# pricing chain with the models of a saved bundle (see artifacts.py), no
+# simulation or training. Chunks are priced on a process pool whose
+# workers load the bundle once at start-up; results are written in input
+# order. An input previous_price column is used for caps & collars.
+# python -m pricing_engine.score --bundle artifacts --input book.parquet --output scored.parquet
+
+SCORE_COLUMNS = ["expected_burn_cost", "glm_burn_cost", "base_price", "optimised_price", "ltv", "quotable", "final_price"]
+
+_worker = None
+
+
+def _init_worker(bundle, strategy=None):
+    # per process: models, config, price grid and compiled rules
+    global _worker
+    models, manifest = load_bundle(bundle)
+    config = STRATEGIES[strategy] if strategy else manifest["config"]
+    _worker = {
+        "models": models,
+        "config": config,
+        "rules": compile_rules(config),
+        "price_grid": np.asarray(manifest["price_grid"] or DEFAULT_PRICE_GRID, dtype=np.float64),
+    }
+
+
+def score_chunk(df):
+    previous_price = df["previous_price"].to_numpy(dtype=np.float64) if "previous_price" in df.columns else None
+    priced = price_quotes(
+        df,
+        _worker["models"],
+        _worker["config"],
+        price_grid=_worker["price_grid"],
+        previous_price=previous_price,
+        rules=_worker["rules"]
+    )
+    if _worker["models"].get("burn_cost_glm") is not None:
+        priced["glm_burn_cost"] = predict_burn_cost_glm(_worker["models"]["burn_cost_glm"], df)
+    return df.assign(**{c: priced[c] for c in SCORE_COLUMNS if c in priced})
+
+
+def _score_worker_chunk(index, df):
+    return index, score_chunk(df)
+
+
+def iter_parquet_chunks(filename, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as err:
+        raise ImportError("scoring a Parquet book needs pyarrow: pip install pyarrow") from err
+
+    for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def score_book(bundle, input_file, output, chunk_size=250_000, workers=None, strategy=None):
+    bundle = resolve_bundle(bundle)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    n_done = 0
+    start = time.perf_counter()
+
+    def written(df):
+        nonlocal n_done
+        writer.write(df)
+        n_done += len(df)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {n_done:,} policies ({n_done / elapsed:,.0f} policies/s)")
+
+    with ParquetChunkWriter(output) as writer:
+        chunks = iter_parquet_chunks(input_file, chunk_size)
+
+        if workers == 1:
+            _init_worker(bundle, strategy)
+            for df in chunks:
+                written(score_chunk(df))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(bundle, strategy)
+            ) as pool:
+                # a couple of chunks per worker in flight bounds memory;
+                # the oldest is always written first, so output keeps input order
+                pending = deque()
+                for i, df in enumerate(chunks):
+                    pending.append(pool.submit(_score_worker_chunk, i, df))
+                    if len(pending) >= 2 * workers:
+                        written(pending.popleft().result()[1])
+                while pending:
+                    written(pending.popleft().result()[1])
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {n_done:,} policies in {elapsed:.1f}s with {os.path.basename(bundle)} -> {output}")
+    return n_done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a policy book with a saved model bundle")
+    parser.add_argument("--bundle", default=DEFAULT_BUNDLE_DIR,
+                        help="bundle folder, or a folder of bundles (newest is used)")
+    parser.add_argument("--input", required=True, help="Parquet policy file")
+    parser.add_argument("--output", default=os.path.join("data", "scored_book.parquet"))
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default=None,
+                        help="override the strategy config saved in the bundle")
+    args = parser.parse_args()
+
+    score_book(args.bundle, args.input, args.output, args.chunk_size, args.workers, args.strategy)
+
+
+if __name__ == "__main__":
+    main()
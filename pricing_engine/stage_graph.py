@@ -0,0 +1,317 @@
+import hashlib
+import inspect
+import os
+import pickle
+import types
+
+import numpy as np
+import pandas as pd
+
+from pricing_engine.model_cache import ModelCache, hash_values
+from pricing_engine.profiling import profile_stage
+
+# dependency-tracked stage graph for incremental re-pricing.
+#
+# a stage reads named columns (from the input frame or from an earlier
+# stage's outputs), a declared set of config keys, of context objects
+# (fitted models, price grid, ...) and of module-level constants (e.g. the
+# rule lists), and returns a dict of output arrays.
+# outputs are cached per row-block under a key built from
+#   - the stage name and version
+#   - a fingerprint of the stage function's code and of the pricing_engine
+#     functions and classes it reaches through its globals, so editing
+#     e.g. optimise_price or the rules engine reruns the stage
+#   - the values of the config keys it reads
+#   - a fingerprint of the context objects and constants it reads
+#   - a hash of each input column over the block, or the upstream stage's
+#     key for that block
+# so a config tweak only reruns the stages that read that key (and the
+# stages below them), and an edited policy only reruns its own block.
+#
+# stage outputs live in an on-disk cache set by environment variables so
+# process-pool workers share it:
+#   PRICING_ENGINE_STAGE_CACHE      "0" disables the cache
+#   PRICING_ENGINE_STAGE_CACHE_DIR  cache folder
+
+BLOCK_SIZE = 25_000
+
+
+class StageCache(ModelCache):
+    enabled_env = "PRICING_ENGINE_STAGE_CACHE"
+    dir_env = "PRICING_ENGINE_STAGE_CACHE_DIR"
+    default_dir = os.path.join(os.path.expanduser("~"), ".cache", "pricing_engine", "stages")
+
+
+default_stage_cache = StageCache()
+
+
+class Stage:
+
+    def __init__(self, name, func, outputs, columns=(), config_keys=(), context_keys=(), constants=None, version=1):
+        # func(frame, config, context) -> {output: array}; frame holds only
+        # `columns`, config / context only the declared keys, and the
+        # constants are added to the context
+        self.name = name
+        self.func = func
+        self.outputs = list(outputs)
+        self.columns = list(columns)
+        self.config_keys = list(config_keys)
+        self.context_keys = list(context_keys)
+        self.constants = dict(constants or {})
+        self.version = version
+
+
+def _update_fingerprint(h, obj, seen):
+    # hashes what an object holds rather than its pickle bytes: a freshly
+    # fitted model and the same model loaded from the model cache pickle
+    # differently (shared vs copied attribute-name strings)
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(f"{type(obj).__name__}:{obj!r};".encode())
+    elif isinstance(obj, np.ndarray):
+        h.update(f"ndarray{obj.shape};".encode())
+        if obj.dtype == object:
+            for item in obj.ravel():
+                _update_fingerprint(h, item, seen)
+        elif obj.dtype.names:
+            # field by field, so struct padding bytes are never read
+            for name in obj.dtype.names:
+                hash_values(h, obj[name])
+        else:
+            hash_values(h, obj)
+    elif isinstance(obj, (pd.Series, pd.DataFrame, pd.Index)):
+        hash_values(h, obj.to_series() if isinstance(obj, pd.Index) else obj)
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)};".encode())
+        for item in obj:
+            _update_fingerprint(h, item, seen)
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)};".encode())
+        for key in sorted(obj, key=repr):
+            h.update(repr(key).encode())
+            _update_fingerprint(h, obj[key], seen)
+    elif callable(obj) and hasattr(obj, "__qualname__"):
+        h.update(f"{getattr(obj, '__module__', '')}.{obj.__qualname__};".encode())
+    else:
+        if id(obj) in seen:
+            h.update(b"<cycle>")
+            return
+        seen.add(id(obj))
+        h.update(f"{type(obj).__module__}.{type(obj).__qualname__};".encode())
+        # what pickle would store: constructor args and state
+        _update_fingerprint(h, obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)[1:3], seen)
+
+
+def _fingerprint(obj):
+    h = hashlib.sha256()
+    _update_fingerprint(h, obj, set())
+    return h.hexdigest()
+
+
+def _const_repr(const):
+    # frozenset constants (`x in {...}`) repr in hash-seed order
+    if isinstance(const, frozenset):
+        return f"frozenset({sorted(map(_const_repr, const))})"
+    if isinstance(const, tuple):
+        return f"({', '.join(map(_const_repr, const))})"
+    return f"{type(const).__name__}:{const!r}"
+
+
+def _update_code(h, code, names):
+    # bytecode, names and constants, nested code objects (inner functions,
+    # comprehensions) included; names collects the globals it may read
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _update_code(h, const, names)
+        else:
+            h.update(f"{_const_repr(const)};".encode())
+
+
+def _is_own(obj):
+    return getattr(obj, "__module__", "").startswith("pricing_engine")
+
+
+def _update_code_fingerprint(h, obj, seen):
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+
+    if inspect.isclass(obj):
+        h.update(f"class {obj.__module__}.{obj.__qualname__};".encode())
+        for base in obj.__bases__:
+            if _is_own(base):
+                _update_code_fingerprint(h, base, seen)
+        for name, member in sorted(vars(obj).items()):
+            if isinstance(member, (staticmethod, classmethod)):
+                member = member.__func__
+            elif isinstance(member, property):
+                member = member.fget
+            if inspect.isfunction(member):
+                h.update(name.encode())
+                _update_code_fingerprint(h, member, seen)
+        return
+
+    # @profiled and other functools.wraps decorators
+    func = inspect.unwrap(obj)
+    h.update(f"def {func.__module__}.{func.__qualname__};".encode())
+    names = set()
+    _update_code(h, func.__code__, names)
+    _update_fingerprint(h, (func.__defaults__, func.__kwdefaults__), set())
+
+    # follow the functions and classes of this package it refers to
+    for name in sorted(names):
+        ref = func.__globals__.get(name)
+        if (inspect.isfunction(ref) or inspect.isclass(ref)) and _is_own(ref):
+            _update_code_fingerprint(h, ref, seen)
+
+
+_code_keys = {}
+
+
+def _code_fingerprint(func):
+    # code does not change within a process, so computed once per function
+    if func not in _code_keys:
+        h = hashlib.sha256()
+        _update_code_fingerprint(h, func, set())
+        _code_keys[func] = h.hexdigest()
+    return _code_keys[func]
+
+
+class StageGraph:
+
+    def __init__(self, stages, block_size=BLOCK_SIZE, cache=None):
+        self.stages = list(stages)
+        self.block_size = block_size
+        self.cache = default_stage_cache if cache is None else cache
+
+        # output name -> producing stage; stages must come after their inputs
+        self.producers = {}
+        for stage in self.stages:
+            for out in stage.outputs:
+                if out in self.producers:
+                    raise ValueError(f"{out} is produced by more than one stage")
+                self.producers[out] = stage
+
+        order = {stage.name: i for i, stage in enumerate(self.stages)}
+        for stage in self.stages:
+            for col in stage.columns:
+                if col in self.producers and order[self.producers[col].name] >= order[stage.name]:
+                    raise ValueError(f"Stage {stage.name} reads {col} before it is produced")
+
+        self.stats = {}
+
+    def _needed(self, targets):
+        if targets is None:
+            return self.stages
+
+        by_name = {stage.name: stage for stage in self.stages}
+        needed = set()
+        todo = [by_name[t] if t in by_name else self.producers[t] for t in targets]
+        while todo:
+            stage = todo.pop()
+            if stage.name in needed:
+                continue
+            needed.add(stage.name)
+            todo.extend(self.producers[c] for c in stage.columns if c in self.producers)
+        return [stage for stage in self.stages if stage.name in needed]
+
+    def _static_key(self, stage, config, context, fingerprints):
+        h = hashlib.sha256()
+        h.update(f"{stage.name}:{stage.version}".encode())
+        h.update(_code_fingerprint(stage.func).encode())
+        h.update(repr([(k, config[k]) for k in stage.config_keys]).encode())
+        for k in stage.context_keys:
+            if k not in fingerprints:
+                fingerprints[k] = _fingerprint(context[k])
+            h.update(f"{k}={fingerprints[k]}".encode())
+        for k, value in sorted(stage.constants.items()):
+            h.update(f"{k}={_fingerprint(value)}".encode())
+        return h.digest()
+
+    def run(self, data, config, context=None, targets=None):
+        # returns {output: array over all rows} for every stage needed by
+        # targets (stage or output names; None runs the whole graph)
+        context = {} if context is None else context
+        stages = self._needed(targets)
+
+        n = len(data)
+        starts = list(range(0, n, self.block_size)) or [0]
+        use_cache = self.cache.is_enabled()
+
+        fingerprints = {}
+        column_hashes = {}
+        block_keys = {}
+        results = {}
+        self.stats = {}
+
+        for stage in stages:
+            static_key = self._static_key(stage, config, context, fingerprints)
+            stage_config = {k: config[k] for k in stage.config_keys}
+            stage_context = {**{k: context[k] for k in stage.context_keys}, **stage.constants}
+            keys = []
+            hits = 0
+
+            for b, start in enumerate(starts):
+                stop = min(start + self.block_size, n)
+
+                h = hashlib.sha256(static_key)
+                for col in stage.columns:
+                    if col in self.producers:
+                        h.update(block_keys[self.producers[col].name][b].encode())
+                    else:
+                        if (col, b) not in column_hashes:
+                            ch = hashlib.sha256()
+                            hash_values(ch, data[col].iloc[start:stop])
+                            column_hashes[col, b] = ch.hexdigest()
+                        h.update(column_hashes[col, b].encode())
+                key = h.hexdigest()
+                keys.append(key)
+
+                outputs = self.cache.get(key) if use_cache else None
+                if outputs is not None:
+                    hits += 1
+                else:
+                    frame = data.iloc[start:stop][
+                        [c for c in stage.columns if c not in self.producers]
+                    ].assign(**{
+                        c: results[c][start:stop] for c in stage.columns if c in self.producers
+                    })
+
+                    # only computed blocks are profiled, not cache hits
+                    with profile_stage(f"stage:{stage.name}", rows=stop - start):
+                        outputs = {
+                            k: np.asarray(v) for k, v in stage.func(frame, stage_config, stage_context).items()
+                        }
+                    if use_cache:
+                        self.cache.put(key, outputs)
+
+                for out in stage.outputs:
+                    if out not in results:
+                        results[out] = np.empty(n, dtype=outputs[out].dtype)
+                    results[out][start:stop] = outputs[out]
+
+            block_keys[stage.name] = keys
+            self.stats[stage.name] = (hits, len(starts))
+
+        return results
+
+    def report(self):
+        return ", ".join(
+            f"{name} {hits}/{total} blocks cached" for name, (hits, total) in self.stats.items()
+        )
+
+
+def add_stage_cache_arguments(parser):
+    parser.add_argument("--no-stage-cache", action="store_true",
+                        help="recompute every pricing stage, ignoring cached row-blocks")
+    parser.add_argument("--clear-stage-cache", action="store_true",
+                        help="delete all cached stage outputs before running")
+
+
+def configure_stage_cache_from_args(args):
+    # exported to the environment so worker processes pick it up
+    os.environ[StageCache.enabled_env] = "0" if args.no_stage_cache else "1"
+    if args.clear_stage_cache:
+        default_stage_cache.clear()
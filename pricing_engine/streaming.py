@@ -0,0 +1,241 @@
+import argparse
+import os
+
+import numpy as np
+
+from pricing_engine.data.generator import generate_policy_data
+from pricing_engine.risk.simulate_claims import simulate_claims
+from pricing_engine.risk.frequency import fit_frequency_model, prepare_features
+from pricing_engine.risk.severity import fit_severity_model
+from pricing_engine.risk.burn_cost import calculate_burn_cost
+
+from pricing_engine.pricing.simulate_demand import simulate_demand
+from pricing_engine.pricing.demand import fit_demand_model, prepare_demand_features
+from pricing_engine.pricing.optimisation import optimise_price
+
+from pricing_engine.constraints.rules import compile_rules
+
+from pricing_engine.evaluation.reporting import overall_report_totals, combine_overall_reports
+from pricing_engine.monitoring.ave import AveMonitor
+
+from pricing_engine.config.base import CONFIG
+from pricing_engine.model_cache import add_cache_arguments, configure_from_args
+from pricing_engine.risk.backends import add_backend_argument, configure_backend
+
+# chunked version of main.py for books that do not fit in memory:
+# models are fitted once on the first chunk, then every chunk is pushed
+# through the pricing chain and appended to a Parquet file. Peak memory
+# depends on chunk_size, not on n_policies.
+
+OUTPUT_COLUMNS = [
+    "age", "gender", "region", "tenure", "smoker", "bmi", "plan", "ncd", "excess",
+    "n_claims", "incurred", "expected_burn_cost", "base_price", "market_price",
+    "renewal_likelihood", "accepted", "optimised_price", "quotable", "final_price",
+]
+
+
+def spawn_seeds(seed, n):
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def stream_seeds(n_policies, chunk_size, seed=0):
+    # one child for the model-fitting pass, then one per chunk
+    n_chunks = -(-n_policies // chunk_size)
+    fit_seed, *chunk_seeds = spawn_seeds(seed, 1 + n_chunks)
+    return fit_seed, chunk_seeds
+
+
+def iter_policy_chunks(n_policies, chunk_size, chunk_seeds):
+    # generation + claims experience, one chunk at a time
+    for start, chunk_seed in zip(range(0, n_policies, chunk_size), chunk_seeds):
+        data_seed, claims_seed, pricing_seed = chunk_seed.spawn(3)
+        n = min(chunk_size, n_policies - start)
+        df = generate_policy_data(n=n, seed=data_seed)
+        df = simulate_claims(df, seed=claims_seed)
+        yield df, pricing_seed
+
+
+def fit_models(df, config=CONFIG, seed=0):
+    # fitted-model pass, run on a single (sample) chunk
+    noise_seed, demand_seed = spawn_seeds(seed, 2)
+
+    X = prepare_features(df)
+    freq_model, feature_cols = fit_frequency_model(df)
+    sev_model = fit_severity_model(df, X)
+
+    df = add_prices(df, freq_model, sev_model, feature_cols, config, noise_seed)
+    df = simulate_demand(
+        df,
+        premium=df["base_price"],
+        market_price=df["market_price"] / config["demand_shock_factor"],
+        seed=demand_seed
+    )
+    demand_model, demand_features = fit_demand_model(df)
+
+    return {
+        "freq_model": freq_model,
+        "sev_model": sev_model,
+        "feature_cols": list(feature_cols),
+        "demand_model": demand_model,
+        "demand_cols": list(demand_features.columns),
+    }
+
+
+def add_prices(df, freq_model, sev_model, feature_cols, config, seed):
+    # a small chunk can miss a category, so align dummies to the fitted columns
+    X = prepare_features(df).reindex(columns=feature_cols, fill_value=0)
+
+    df["expected_burn_cost"] = calculate_burn_cost(freq_model, sev_model, X)
+    df["base_price"] = df["expected_burn_cost"] * (1 + config["profit_margin"])
+
+    noise = np.random.default_rng(seed).normal(1.0, 0.05, size=len(df))
+    df["market_price"] = df["base_price"] * 1.2 * noise
+    return df
+
+
+def price_chunk(df, models, config, price_grid, expenses, seed):
+    noise_seed, demand_seed = spawn_seeds(seed, 2)
+
+    df = add_prices(
+        df, models["freq_model"], models["sev_model"], models["feature_cols"], config, noise_seed
+    )
+
+    df = simulate_demand(
+        df,
+        premium=df["base_price"],
+        market_price=df["market_price"] / config["demand_shock_factor"],
+        seed=demand_seed
+    )
+
+    demand_features = prepare_demand_features(df).reindex(
+        columns=models["demand_cols"], fill_value=0
+    )
+
+    target_price, _ = optimise_price(
+        base_price=df["base_price"],
+        price_grid=price_grid,
+        demand_model=models["demand_model"],
+        demand_features=demand_features,
+        burn_cost=df["expected_burn_cost"],
+        expenses=expenses
+    )
+    df["optimised_price"] = target_price
+
+    df["quotable"], df["final_price"] = compile_rules(config).apply(
+        df,
+        price=target_price,
+        previous_price=df["base_price"] * 0.95,
+        declined_price=np.nan
+    )
+    return df
+
+
+def stream_pipeline(n_policies, chunk_size, config=CONFIG, seed=0, price_grid=None):
+    # yields (models, priced chunk); models come from the first chunk
+    if price_grid is None:
+        price_grid = np.linspace(0.8, 1.4, 15)
+    expenses = 25 * config["expense_multiplier"]
+
+    fit_seed, chunk_seeds = stream_seeds(n_policies, chunk_size, seed)
+
+    models = None
+    for df, pricing_seed in iter_policy_chunks(n_policies, chunk_size, chunk_seeds):
+        if models is None:
+            print(f"Fitting models on first chunk ({len(df):,} policies)...")
+            models = fit_models(df.copy(), config, seed=fit_seed)
+
+        yield models, price_chunk(df, models, config, price_grid, expenses, pricing_seed)
+
+
+class ParquetChunkWriter:
+
+    def __init__(self, filename, compression="zstd"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise ImportError("streaming output needs pyarrow: pip install pyarrow") from err
+
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self._pa = pa
+        self._pq = pq
+        self.filename = filename
+        self.compression = compression
+        self._writer = None
+
+    def write(self, df):
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(
+                self.filename, table.schema, compression=self.compression
+            )
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_streaming(n_policies, chunk_size, output, config=CONFIG, seed=0):
+
+    expenses = 25 * config["expense_multiplier"]
+
+    totals = []
+    ave = AveMonitor(columns={"actual_renewal": "accepted"})
+    n_done = 0
+
+    with ParquetChunkWriter(output) as writer:
+        for _, df in stream_pipeline(n_policies, chunk_size, config, seed):
+
+            ave.update(df)
+            totals.append(overall_report_totals(df, price_col="final_price", accept_col="quotable"))
+            writer.write(df[OUTPUT_COLUMNS])
+
+            n_done += len(df)
+            print(f"Priced {n_done:,} / {n_policies:,} policies")
+
+    overall_report = combine_overall_reports(totals, expenses=expenses)
+    ave_metrics = ave.overall()
+    overall_report["ave_gwp"] = ave_metrics["AVE_GWP"]
+    overall_report["ave_claims"] = ave_metrics["AVE_Claims"]
+
+    return overall_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked pricing run for large books")
+    parser.add_argument("--n-policies", type=int, default=5_000_000)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument("--output", default=os.path.join("data", "priced_book.parquet"))
+    parser.add_argument("--seed", type=int, default=0)
+    add_cache_arguments(parser)
+    add_backend_argument(parser)
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_backend(args.model_backend)
+
+    overall_report = run_streaming(
+        args.n_policies,
+        args.chunk_size,
+        args.output,
+        seed=args.seed
+    )
+    print(overall_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import numpy as np
+
+# fixed-memory summaries for values that arrive in batches: running
+# mean / variance (Welford, with Chan's update for whole batches) and a
+# mergeable quantile sketch (merging t-digest). Both can be combined across
+# chunks, workers or replications with merge().
+
+
+class RunningStats:
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, values):
+        # values: (m,) for one quantity or (m, k) for k quantities at once
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        self._combine(len(values), values.mean(axis=0), ((values - values.mean(axis=0)) ** 2).sum(axis=0))
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+
+    def _combine(self, count, mean, m2):
+        if self.count == 0:
+            self.count = count
+            self.mean = np.array(mean, dtype=np.float64)
+            self._m2 = np.array(m2, dtype=np.float64)
+            return
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self._m2 = self._m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    @property
+    def variance(self):
+        # sample variance (ddof=1)
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan) if self.mean is not None else np.nan
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def sem(self):
+        return self.std / np.sqrt(self.count)
+
+
+class QuantileSketch:
+    # merging t-digest: values are folded into at most ~compression
+    # weighted centroids, kept small near the tails (k1 scale function) so
+    # extreme quantiles such as 2.5% / 97.5% stay accurate
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self._buffer.append((values, np.ones(len(values))))
+        self._buffered += len(values)
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        if self._buffered > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        if other.count == 0:
+            return
+        self._buffer.append((other.means, other.weights))
+        self._buffered += len(other.means)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _k(self, q):
+        return self.compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0, 1) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+
+        means = np.concatenate([self.means] + [m for m, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+
+        new_means = []
+        new_weights = []
+        cur_mean, cur_weight = means[0], weights[0]
+        done = 0.0
+        k_left = self._k(0.0)
+        for m, w in zip(means[1:], weights[1:]):
+            # merge while the centroid spans at most one unit of k
+            if self._k((done + cur_weight + w) / total) - k_left <= 1:
+                cur_weight += w
+                cur_mean += (m - cur_mean) * w / cur_weight
+            else:
+                new_means.append(cur_mean)
+                new_weights.append(cur_weight)
+                done += cur_weight
+                k_left = self._k(done / total)
+                cur_mean, cur_weight = m, w
+        new_means.append(cur_mean)
+        new_weights.append(cur_weight)
+
+        self.means = np.array(new_means)
+        self.weights = np.array(new_weights)
+
+    def _centres(self):
+        # cumulative weight at each centroid's centre, anchored at min / max
+        self._compress()
+        cum = np.cumsum(self.weights) - self.weights / 2
+        x = np.concatenate([[self.min], self.means, [self.max]])
+        c = np.concatenate([[0.0], cum, [self.count]])
+        return x, c
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        x, c = self._centres()
+        return np.interp(np.asarray(q, dtype=np.float64) * self.count, c, x)
+
+    def cdf(self, values):
+        if self.count == 0:
+            return np.full(np.shape(values), np.nan) if np.ndim(values) else np.nan
+        x, c = self._centres()
+        return np.interp(values, x, c, left=0.0, right=self.count) / self.count